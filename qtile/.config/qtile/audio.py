@@ -0,0 +1,118 @@
+import asyncio
+import importlib.util
+
+import profiling
+from providers import Provider
+
+# How long to wait before reconnecting when the sound server goes away
+# (in seconds)
+VOLUME_RECONNECT_DELAY = 2
+
+
+class VolumeProvider(Provider):
+    # Owns one persistent PulseAudio/PipeWire connection that both the bar
+    # and the volume keys go through. The sink is only re-read when the
+    # server reports a change to it, or a new default sink. Publishes
+    # (volume, muted) tuples. Needs pulsectl-asyncio, the same optional
+    # dependency as qtile's PulseVolume widget; without it the value simply
+    # stays None and the bar uses widget.Volume instead (see available()).
+    def __init__(self, reconnect_delay=VOLUME_RECONNECT_DELAY):
+        super().__init__()
+        self.reconnect_delay = reconnect_delay
+        self._pulse = None
+        self._sink_index = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.disconnect()
+
+    async def connect(self):
+        if self._pulse is None:
+            import pulsectl_asyncio
+
+            pulse = pulsectl_asyncio.PulseAsync("qtile")
+            await pulse.connect()
+            self._pulse = pulse
+        return self._pulse
+
+    def disconnect(self):
+        if self._pulse is not None:
+            self._pulse.close()
+            self._pulse = None
+
+    async def default_sink(self):
+        pulse = await self.connect()
+        info = await pulse.server_info()
+        sink = await pulse.get_sink_by_name(info.default_sink_name)
+        self._sink_index = sink.index
+        return sink
+
+    @profiling.timed("poll.volume")
+    async def refresh(self):
+        try:
+            sink = await self.default_sink()
+        except Exception:
+            # Dropped connection or no server; reconnect on the next attempt
+            self.disconnect()
+            return
+        self.publish(self._read(sink))
+
+    async def change(self, delta):
+        # `delta` is in percent, like `pactl set-sink-volume ... +2%`
+        sink = await self.default_sink()
+        await self._pulse.volume_change_all_chans(sink, delta / 100)
+        self.publish(self._read(sink))
+
+    async def set_volume(self, percent):
+        sink = await self.default_sink()
+        await self._pulse.volume_set_all_chans(sink, percent / 100)
+        self.publish(self._read(sink))
+
+    async def toggle_mute(self):
+        sink = await self.default_sink()
+        await self._pulse.mute(sink, not sink.mute)
+        self.publish(self._read(sink))
+
+    async def _run(self):
+        while True:
+            try:
+                pulse = await self.connect()
+                await self.refresh()
+                async for event in pulse.subscribe_events("sink", "server"):
+                    # Server events cover a change of default sink
+                    if event.facility == "server" or event.index == self._sink_index:
+                        await self.refresh()
+            except ImportError:
+                # No pulsectl-asyncio; nothing will ever connect
+                return
+            except Exception:
+                pass
+            self.disconnect()
+            await asyncio.sleep(self.reconnect_delay)
+
+    @staticmethod
+    def _read(sink):
+        return round(sink.volume.value_flat * 100), bool(sink.mute)
+
+
+def available():
+    # Whether VolumeProvider can ever connect; checked without importing it
+    return importlib.util.find_spec("pulsectl_asyncio") is not None
+
+
+provider = VolumeProvider()
+
+
+def get_volume(value):
+    if value is None:
+        return "N/A"
+    volume, muted = value
+    if muted:
+        return "M"
+    return f"{volume}%"
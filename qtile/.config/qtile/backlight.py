@@ -0,0 +1,135 @@
+import asyncio
+import os
+
+import fswatch
+import profiling
+from providers import Provider
+
+BACKLIGHT_DIR = "/sys/class/backlight"
+
+# Only used when inotify can't be set up (in seconds)
+BRIGHTNESS_POLL_INTERVAL = 5
+
+
+# Preferred interface kinds, best first, the order systemd-backlight uses:
+# firmware (ACPI), then platform (EC) drivers, then raw GPU registers.
+# Devices without a known type come last; ties go to the first name.
+BACKLIGHT_TYPES = ("firmware", "platform", "raw")
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _backlight_rank(device):
+    try:
+        kind = _read(os.path.join(device, "type"))
+    except OSError:
+        kind = None
+    if kind in BACKLIGHT_TYPES:
+        return BACKLIGHT_TYPES.index(kind)
+    return len(BACKLIGHT_TYPES)
+
+
+def find_backlight(root=BACKLIGHT_DIR):
+    try:
+        devices = [os.path.join(root, name) for name in sorted(os.listdir(root))]
+    except OSError:
+        return None
+    return min(devices, key=_backlight_rank) if devices else None
+
+
+def _read_int(path):
+    return int(_read(path))
+
+
+@profiling.timed("poll.brightness")
+def read_brightness(device):
+    # Same figure `brightnessctl -m` reports, without the four processes
+    try:
+        current = _read_int(os.path.join(device, "brightness"))
+        maximum = _read_int(os.path.join(device, "max_brightness"))
+    except (OSError, ValueError):
+        return None
+    if maximum <= 0:
+        return None
+    return round(current * 100 / maximum)
+
+
+def step_brightness(device, step):
+    # Moves the raw value by `step` percent of the range, and by at least one
+    # unit: on a coarse backlight (max_brightness of 10 or so) a 5% step
+    # would otherwise round back to the value it started from. Needs write
+    # access to the sysfs node (video group or a udev rule).
+    maximum = _read_int(os.path.join(device, "max_brightness"))
+    current = _read_int(os.path.join(device, "brightness"))
+    delta = round(step * maximum / 100)
+    if step and not delta:
+        delta = 1 if step > 0 else -1
+    with open(os.path.join(device, "brightness"), "w") as f:
+        f.write(str(max(0, min(maximum, current + delta))))
+
+
+class BrightnessProvider(Provider):
+    # Reads the backlight straight from sysfs and republishes only when
+    # inotify reports a change. `brightness` fires when something writes it,
+    # `actual_brightness` when the firmware changes it (e.g. hotkeys).
+    def __init__(self, device=None, poll_interval=BRIGHTNESS_POLL_INTERVAL):
+        super().__init__()
+        self.device = device
+        self.poll_interval = poll_interval
+        self._watcher = None
+        self._timer = None
+
+    def start(self):
+        if self.device is None:
+            self.device = find_backlight()
+        if self.device is None:
+            return
+
+        self.value = read_brightness(self.device)
+        try:
+            self._watcher = fswatch.Watcher(self._on_change)
+            brightness = os.path.join(self.device, "brightness")
+            self._watcher.add(brightness, fswatch.IN_MODIFY)
+            actual = os.path.join(self.device, "actual_brightness")
+            if os.path.exists(actual):
+                self._watcher.add(actual, fswatch.IN_MODIFY)
+        except OSError:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+            self._timer = asyncio.get_running_loop().call_later(
+                self.poll_interval, self.poll
+            )
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def poll(self):
+        self.refresh()
+        self._timer = asyncio.get_running_loop().call_later(
+            self.poll_interval, self.poll
+        )
+
+    def refresh(self):
+        if self.device is not None:
+            self.publish(read_brightness(self.device))
+
+    def _on_change(self, _path, _mask, _name):
+        self.refresh()
+
+
+provider = BrightnessProvider()
+
+
+def get_brightness(value):
+    if value is None:
+        return "N/A"
+    return f"{value}%"
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+
+from providers import Provider
+
+logger = logging.getLogger("libqtile")
+
+UPOWER = "org.freedesktop.UPower"
+# UPower's aggregate of all batteries, the same device upower -d shows first
+DISPLAY_DEVICE = "/org/freedesktop/UPower/devices/DisplayDevice"
+DEVICE_INTERFACE = "org.freedesktop.UPower.Device"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+# UPower.Device State values
+STATE_CHARGING = 1
+STATE_DISCHARGING = 2
+STATE_EMPTY = 3
+STATE_FULLY_CHARGED = 4
+STATE_PENDING_CHARGE = 5
+STATE_PENDING_DISCHARGE = 6
+
+# Empty, 10%, 20% ... full
+BATTERY_ICONS = "󰂎󰁺󰁻󰁼󰁽󰁾󰁿󰂀󰂁󰂂󰁹"
+BATTERY_CHARGING_ICON = "󰂄"
+
+TEXT_CHARGING = "(Plugged In)"
+TEXT_DISCHARGING = "(On Battery)"
+
+
+class BatteryProvider(Provider):
+    # Reads the display device once and then follows its PropertiesChanged
+    # signal; nothing polls. Publishes (percentage, state) tuples.
+    # `bus` is anything with dbus_fast's MessageBus call/add_message_handler/
+    # remove_message_handler, e.g. battery_stub.StubBus; by default the system
+    # bus is connected on start.
+    def __init__(self, bus=None, path=DISPLAY_DEVICE):
+        super().__init__()
+        self.path = path
+        self._bus = bus
+        self._own_bus = bus is None
+        self._task = None
+        self._match = (
+            f"type='signal',sender='{UPOWER}',path='{path}',"
+            f"interface='{PROPERTIES_INTERFACE}',member='PropertiesChanged'"
+        )
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._connect())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._bus is not None:
+            self._bus.remove_message_handler(self._on_message)
+            if self._own_bus:
+                self._bus.disconnect()
+                self._bus = None
+
+    async def _connect(self):
+        from dbus_fast import BusType, Message, MessageType
+
+        try:
+            if self._bus is None:
+                from dbus_fast.aio import MessageBus
+
+                self._bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+
+            # Subscribe before reading so no change falls in between
+            self._bus.add_message_handler(self._on_message)
+            await self._bus.call(
+                Message(
+                    destination="org.freedesktop.DBus",
+                    path="/org/freedesktop/DBus",
+                    interface="org.freedesktop.DBus",
+                    member="AddMatch",
+                    signature="s",
+                    body=[self._match],
+                )
+            )
+            reply = await self._bus.call(
+                Message(
+                    destination=UPOWER,
+                    path=self.path,
+                    interface=PROPERTIES_INTERFACE,
+                    member="GetAll",
+                    signature="s",
+                    body=[DEVICE_INTERFACE],
+                )
+            )
+        except Exception:
+            logger.exception("could not read the battery from UPower")
+            return
+
+        if reply.message_type == MessageType.ERROR:
+            logger.warning("UPower: %s", reply.body)
+            return
+        self._update(reply.body[0])
+
+    def _on_message(self, message):
+        if (
+            message.member != "PropertiesChanged"
+            or message.path != self.path
+            or message.body[0] != DEVICE_INTERFACE
+        ):
+            return
+        self._update(message.body[1])
+
+    def _update(self, properties):
+        percentage, state = self.value or (None, None)
+        if "Percentage" in properties:
+            percentage = properties["Percentage"].value
+        if "State" in properties:
+            state = properties["State"].value
+        if percentage is not None:
+            self.publish((percentage, state))
+
+
+provider = BatteryProvider()
+
+
+def get_battery_icon(value):
+    if value is None:
+        return BATTERY_ICONS[0]
+    percentage, state = value
+    if state in (STATE_CHARGING, STATE_PENDING_CHARGE):
+        return BATTERY_CHARGING_ICON
+    return BATTERY_ICONS[min(10, round(percentage / 10))]
+
+
+def get_battery_state(value):
+    if value is None:
+        return ""
+    if value[1] in (STATE_CHARGING, STATE_FULLY_CHARGED, STATE_PENDING_CHARGE):
+        return TEXT_CHARGING
+    return TEXT_DISCHARGING
+
+
+def get_battery_percent(value):
+    if value is None:
+        return "N/A"
+    return f"{value[0]:.0f}%"
@@ -0,0 +1,99 @@
+# Local stand-in for the UPower display device, for driving BatteryProvider
+# without a system bus or a battery:
+#
+#   bus = StubBus(percentage=80.0, state=battery.STATE_DISCHARGING)
+#   provider = battery.BatteryProvider(bus)
+#   bus.set(percentage=79.0)
+#
+#   python battery_stub.py    # runs a short discharge/charge cycle
+import asyncio
+
+from dbus_fast import Message, MessageType, Variant
+
+import battery
+
+
+class StubBus:
+    # Answers GetAll and AddMatch the way the system bus would and emits
+    # PropertiesChanged on set()
+    def __init__(self, percentage=100.0, state=battery.STATE_FULLY_CHARGED):
+        self.properties = {"Percentage": percentage, "State": state}
+        self.handlers = []
+        self.calls = []
+
+    async def call(self, message):
+        self.calls.append(message.member)
+        serial = len(self.calls)
+        if message.member == "GetAll":
+            return Message(
+                message_type=MessageType.METHOD_RETURN,
+                reply_serial=serial,
+                signature="a{sv}",
+                body=[self._variants(self.properties)],
+            )
+        if message.member == "AddMatch":
+            return Message(message_type=MessageType.METHOD_RETURN, reply_serial=serial)
+        return Message(
+            message_type=MessageType.ERROR,
+            reply_serial=serial,
+            error_name="org.freedesktop.DBus.Error.UnknownMethod",
+            signature="s",
+            body=[message.member],
+        )
+
+    def add_message_handler(self, handler):
+        self.handlers.append(handler)
+
+    def remove_message_handler(self, handler):
+        if handler in self.handlers:
+            self.handlers.remove(handler)
+
+    def disconnect(self):
+        self.handlers.clear()
+
+    def set(self, percentage=None, state=None):
+        changed = {}
+        if percentage is not None:
+            changed["Percentage"] = percentage
+        if state is not None:
+            changed["State"] = state
+        self.properties.update(changed)
+
+        signal = Message.new_signal(
+            battery.DISPLAY_DEVICE,
+            battery.PROPERTIES_INTERFACE,
+            "PropertiesChanged",
+            "sa{sv}as",
+            [battery.DEVICE_INTERFACE, self._variants(changed), []],
+        )
+        for handler in list(self.handlers):
+            handler(signal)
+
+    @staticmethod
+    def _variants(properties):
+        types = {"Percentage": "d", "State": "u"}
+        return {k: Variant(types[k], v) for k, v in properties.items()}
+
+
+async def _demo():
+    bus = StubBus(percentage=42.0, state=battery.STATE_DISCHARGING)
+    provider = battery.BatteryProvider(bus)
+
+    def show(value):
+        print(
+            battery.get_battery_icon(value),
+            battery.get_battery_state(value),
+            battery.get_battery_percent(value),
+        )
+
+    provider.subscribe(show)
+    await asyncio.sleep(0)
+    for percentage in (41.0, 40.0, 40.0, 39.0):
+        bus.set(percentage=percentage)
+    bus.set(state=battery.STATE_CHARGING)
+    bus.set(percentage=100.0, state=battery.STATE_FULLY_CHARGED)
+    provider.unsubscribe(show)
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
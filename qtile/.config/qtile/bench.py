@@ -0,0 +1,445 @@
+# Offline benchmarks and regression checks for the bar's data sources. A fake
+# sysfs tree, the local weather stub and a fake brightnessctl on PATH stand in
+# for the hardware and the network. Prints per-call latency and how many
+# subprocesses each call spawned.
+#
+#   python bench.py
+#   python bench.py --save baseline.json
+#   python bench.py --compare baseline.json   # exits 1 on a slowdown
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import backlight
+import controls
+import env
+import weather
+import weather_stub
+
+# Slowdown of the mean against a saved baseline that counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+# Expected icon per OpenWeatherMap code and description
+OWM_CONDITIONS = [
+    (200, "thunderstorm with light rain", "rain"),
+    (201, "thunderstorm with rain", "rain"),
+    (202, "thunderstorm with heavy rain", "rain"),
+    (210, "light thunderstorm", "rain"),
+    (211, "thunderstorm", "rain"),
+    (212, "heavy thunderstorm", "rain"),
+    (221, "ragged thunderstorm", "rain"),
+    (230, "thunderstorm with light drizzle", "rain"),
+    (231, "thunderstorm with drizzle", "rain"),
+    (232, "thunderstorm with heavy drizzle", "rain"),
+    (300, "light intensity drizzle", "rain"),
+    (301, "drizzle", "rain"),
+    (302, "heavy intensity drizzle", "rain"),
+    (310, "light intensity drizzle rain", "rain"),
+    (311, "drizzle rain", "rain"),
+    (312, "heavy intensity drizzle rain", "rain"),
+    (313, "shower rain and drizzle", "rain"),
+    (314, "heavy shower rain and drizzle", "rain"),
+    (321, "shower drizzle", "rain"),
+    (500, "light rain", "rain"),
+    (501, "moderate rain", "rain"),
+    (502, "heavy intensity rain", "rain"),
+    (503, "very heavy rain", "rain"),
+    (504, "extreme rain", "rain"),
+    (511, "freezing rain", "snow"),
+    (520, "light intensity shower rain", "rain"),
+    (521, "shower rain", "rain"),
+    (522, "heavy intensity shower rain", "rain"),
+    (531, "ragged shower rain", "rain"),
+    (600, "light snow", "snow"),
+    (601, "snow", "snow"),
+    (602, "heavy snow", "snow"),
+    (611, "sleet", "snow"),
+    (612, "light shower sleet", "snow"),
+    (613, "shower sleet", "snow"),
+    (615, "light rain and snow", "snow"),
+    (616, "rain and snow", "snow"),
+    (620, "light shower snow", "snow"),
+    (621, "shower snow", "snow"),
+    (622, "heavy shower snow", "snow"),
+    (701, "mist", "fog"),
+    (711, "smoke", "fog"),
+    (721, "haze", "fog"),
+    (731, "sand/dust whirls", "fog"),
+    (741, "fog", "fog"),
+    (751, "sand", "fog"),
+    (761, "dust", "fog"),
+    (762, "volcanic ash", "fog"),
+    (771, "squalls", "snow"),
+    (781, "tornado", "default"),
+    (800, "clear sky", "sun"),
+    (801, "few clouds", "cloud"),
+    (802, "scattered clouds", "cloud"),
+    (803, "broken clouds", "cloud"),
+    (804, "overcast clouds", "cloud"),
+]
+
+# Expected icon per Environment Canada <condition> string
+EC_CONDITIONS = [
+    ("Sunny", "sun"),
+    ("Mainly Sunny", "sun"),
+    ("Partly Cloudy", "cloud"),
+    ("Mostly Cloudy", "cloud"),
+    ("Cloudy", "cloud"),
+    ("Overcast", "cloud"),
+    ("Clear", "sun"),
+    ("Mainly Clear", "sun"),
+    ("A mix of sun and cloud", "cloud"),
+    ("Increasing cloudiness", "cloud"),
+    ("Clearing", "sun"),
+    ("Light Rain", "rain"),
+    ("Rain", "rain"),
+    ("Heavy Rain", "rain"),
+    ("Light Rainshower", "rain"),
+    ("Rainshower", "rain"),
+    ("Heavy Rainshower", "rain"),
+    ("Light Drizzle", "rain"),
+    ("Drizzle", "rain"),
+    ("Heavy Drizzle", "rain"),
+    ("Light Freezing Drizzle", "snow"),
+    ("Freezing Drizzle", "snow"),
+    ("Light Freezing Rain", "snow"),
+    ("Freezing Rain", "snow"),
+    ("Light Snow", "snow"),
+    ("Snow", "snow"),
+    ("Heavy Snow", "snow"),
+    ("Light Snowshower", "snow"),
+    ("Snowshower", "snow"),
+    ("Heavy Snowshower", "snow"),
+    ("Light Snow Grains", "snow"),
+    ("Snow Grains", "snow"),
+    ("Ice Crystals", "snow"),
+    ("Ice Pellets", "snow"),
+    ("Light Ice Pellets", "snow"),
+    ("Heavy Ice Pellets", "snow"),
+    ("Hail", "snow"),
+    ("Light Hail", "snow"),
+    ("Blowing Snow", "snow"),
+    ("Drifting Snow", "snow"),
+    ("Snow Squall", "snow"),
+    ("Light Rain and Snow", "snow"),
+    ("Rain and Snow", "snow"),
+    ("Light Flurries", "snow"),
+    ("Flurries", "snow"),
+    ("Thunderstorm", "rain"),
+    ("Thunderstorm with light rainshowers", "rain"),
+    ("Thunderstorm with heavy rainshowers", "rain"),
+    ("Thunderstorm with hail", "snow"),
+    ("Thunderstorm with Rain", "rain"),
+    ("Heavy Thunderstorm", "rain"),
+    ("Fog", "fog"),
+    ("Fog Patches", "fog"),
+    ("Ice Fog", "snow"),
+    ("Freezing Fog", "snow"),
+    ("Shallow Fog", "fog"),
+    ("Mist", "fog"),
+    ("Haze", "fog"),
+    ("Smoke", "fog"),
+    ("Volcanic Ash", "fog"),
+    ("Dust", "default"),
+    ("Blowing Dust", "snow"),
+    ("Sand", "default"),
+    ("Dust Devils", "default"),
+    ("Funnel Cloud", "cloud"),
+    ("Tornado", "default"),
+    ("Waterspout", "default"),
+    ("Not observed", "default"),
+    ("Squalls", "snow"),
+    ("Precipitation", "default"),
+    ("Light Precipitation", "default"),
+    ("Heavy Precipitation", "default"),
+    ("Light Snow and Blowing Snow", "snow"),
+    ("Snow and Blowing Snow", "snow"),
+    ("Sunny with cloudy periods", "cloud"),
+    ("Cloudy with sunny periods", "cloud"),
+    ("", "default"),
+    ("Unknown", "default"),
+]
+
+# Written onto PATH ahead of the real one
+FAKE_BRIGHTNESSCTL = """#!/bin/sh
+[ "$1" = "-m" ] && echo "intel_backlight,backlight,400,40%,1000"
+exit 0
+"""
+
+_spawned = 0
+
+
+def _audit(event, _args):
+    global _spawned
+    if event in ("subprocess.Popen", "os.system", "os.posix_spawn"):
+        _spawned += 1
+
+
+def bench(results, name, func, number=200, timing=True):
+    # timing=False: too noisy to compare between runs (loopback HTTP); only
+    # the spawn count is checked
+    func()  # warm up caches and imports
+    start_spawned = _spawned
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    results[name] = {
+        "calls": number,
+        "mean_us": round(statistics.mean(times), 2),
+        "p95_us": round(times[int(len(times) * 0.95) - 1], 2),
+        "spawns_per_call": (_spawned - start_spawned) / number,
+        "timing": timing,
+    }
+
+
+def check_conditions():
+    # An empty glyph collapses the icon widget to nothing
+    icons = weather.WEATHER_ICONS
+    failures = [f"{name}: empty icon" for name, icon in icons.items() if not icon]
+    for code, text, expected in OWM_CONDITIONS:
+        for got in (
+            weather.get_weather_condition(text, code),
+            weather.get_weather_condition(text.upper(), code),
+        ):
+            if got != weather.WEATHER_ICONS[expected]:
+                failures.append(f"{code} {text!r}: expected {expected}")
+    for text, expected in EC_CONDITIONS:
+        for variant in (text, text.lower(), text.upper()):
+            got = weather.get_weather_condition(variant)
+            if got != weather.WEATHER_ICONS[expected]:
+                failures.append(f"{variant!r}: expected {expected}")
+    return failures
+
+
+def make_sysfs(root):
+    device = os.path.join(root, "backlight", "intel_backlight")
+    os.makedirs(device)
+    for name, value in (("brightness", 400), ("max_brightness", 1000)):
+        with open(os.path.join(device, name), "w") as f:
+            f.write(f"{value}\n")
+    return device
+
+
+def make_fake_bin(root):
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    path = os.path.join(bin_dir, "brightnessctl")
+    with open(path, "w") as f:
+        f.write(FAKE_BRIGHTNESSCTL)
+    os.chmod(path, 0o755)
+    return bin_dir
+
+
+def legacy_brightness():
+    # The pre-sysfs widget: four processes per poll
+    command = "brightnessctl -m | awk -F, '{print $4}' | tr -d '%' "
+    return subprocess.run(command, shell=True, capture_output=True, text=True)
+
+
+def key_repeat_burst(device, repeats=30):
+    # A held key: `repeats` presses inside one coalescing window. With no
+    # device the change falls back to brightnessctl.
+    async def run():
+        backlight.provider.device = device
+        backlight.provider.value = 40
+        for _ in range(repeats):
+            controls.change_brightness(None, 1)
+        await asyncio.sleep(controls.COALESCE_DELAY * 2)
+
+    asyncio.run(run())
+
+
+def battery_signal():
+    # One PropertiesChanged from UPower through to all three battery texts
+    import battery
+    from battery_stub import StubBus
+
+    async def run():
+        bus = StubBus(percentage=50.0, state=battery.STATE_DISCHARGING)
+        provider = battery.BatteryProvider(bus)
+        rendered = []
+
+        def render(value):
+            rendered.append(
+                (
+                    battery.get_battery_icon(value),
+                    battery.get_battery_state(value),
+                    battery.get_battery_percent(value),
+                )
+            )
+
+        provider.subscribe(render)
+        await asyncio.sleep(0)
+        bus.set(percentage=49.0)
+        provider.unsubscribe(render)
+
+    asyncio.run(run())
+
+
+def run_benchmarks(root):
+    results = {}
+    device = make_sysfs(root)
+    os.environ["PATH"] = make_fake_bin(root) + os.pathsep + os.environ["PATH"]
+
+    strings = [(text, code) for code, text, _ in OWM_CONDITIONS] + [
+        (text, None) for text, _ in EC_CONDITIONS
+    ]
+
+    def classify_cold():
+        weather._classify_text.cache_clear()
+        for text, _code in strings:
+            weather.get_weather_condition(text)
+
+    def classify_warm():
+        for text, _code in strings:
+            weather.get_weather_condition(text)
+
+    bench(results, "condition: text, cold cache (per table)", classify_cold)
+    bench(results, "condition: text, warm cache (per table)", classify_warm)
+    bench(
+        results,
+        "condition: by OWM code (per table)",
+        lambda: [weather.get_weather_condition(t, c) for t, c in strings],
+    )
+
+    bench(
+        results, "brightness: sysfs read", lambda: backlight.read_brightness(device)
+    )
+    # One spawn counted here is the shell; the pipeline itself is three more
+    bench(results, "brightness: legacy shell pipeline", legacy_brightness, number=20)
+
+    bench(
+        results,
+        "brightness keys: 30 repeats, sysfs",
+        lambda: key_repeat_burst(device),
+        number=10,
+    )
+    bench(
+        results,
+        "brightness keys: 30 repeats, fallback",
+        lambda: key_repeat_burst(None),
+        number=10,
+    )
+
+    server = weather_stub.serve(0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    os.environ["WEATHER_API_KEY"] = "bench"
+    os.environ["WEATHER_URL"] = f"http://127.0.0.1:{port}/?appid={{key}}"
+    os.environ["WEATHER_EC_URL"] = f"http://127.0.0.1:{port}/ec.xml"
+    with quiet:
+        for source in ("owm", "ec"):
+            os.environ["WEATHER_SOURCES"] = source
+
+            def fetch():
+                return asyncio.run(weather.fetch_weather())
+
+            def full_fetch():
+                weather._sources = None
+                fetch()
+
+            bench(
+                results,
+                f"weather: {source} fetch + parse",
+                full_fetch,
+                number=50,
+                timing=False,
+            )
+            bench(
+                results,
+                f"weather: {source} 304 revalidate",
+                fetch,
+                number=50,
+                timing=False,
+            )
+    server.shutdown()
+
+    try:
+        import battery_stub  # noqa: F401 (needs dbus_fast)
+    except ImportError as e:
+        print(f"skipping battery: {e}", file=sys.stderr)
+    else:
+        bench(results, "battery: signal to rendered text", battery_signal)
+
+    env_path = os.path.join(root, ".env")
+    with open(env_path, "w") as f:
+        f.write("# secrets\nWEATHER_API_KEY=bench\nOTHER=1\n")
+
+    def env_cold():
+        env.EnvFile(env_path).load()
+
+    bench(results, "env: load .env, cold", env_cold)
+    bench(results, "env: load .env, unchanged", env.EnvFile(env_path).load)
+
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':<44}{'mean us':>12}{'p95 us':>12}{'spawns':>8}")
+    for name, r in results.items():
+        line = (
+            f"{name:<44}{r['mean_us']:>12.1f}{r['p95_us']:>12.1f}"
+            f"{r['spawns_per_call']:>8.2f}"
+        )
+        if baseline and name in baseline:
+            line += f"  x{r['mean_us'] / baseline[name]['mean_us']:.2f}"
+        print(line)
+
+
+def regressions(results, baseline):
+    found = []
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if r["timing"] and r["mean_us"] > old["mean_us"] * REGRESSION_THRESHOLD:
+            found.append(f"{name}: {old['mean_us']}us -> {r['mean_us']}us")
+        if r["spawns_per_call"] > old["spawns_per_call"]:
+            found.append(
+                f"{name}: {old['spawns_per_call']} -> {r['spawns_per_call']} spawns"
+            )
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="fail on regressions against this file")
+    args = parser.parse_args()
+
+    failures = check_conditions()
+    for failure in failures:
+        print(f"condition table: {failure}", file=sys.stderr)
+
+    sys.addaudithook(_audit)
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["XDG_CACHE_HOME"] = root
+        results = run_benchmarks(root)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    found = regressions(results, baseline) if baseline else []
+    for regression in found:
+        print(f"regression: {regression}", file=sys.stderr)
+    sys.exit(1 if failures or found else 0)
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import time
+
+from providers import Provider
+
+DATE_FORMAT = "%Y-%m-%d %a"
+TIME_FORMAT = "%H:%M"
+
+# Fire this long after the minute boundary so a slightly early wakeup still
+# lands in the new minute (in seconds)
+CLOCK_SLACK = 0.05
+
+
+class ClockProvider(Provider):
+    # One timer for every date and time widget on every bar, firing once per
+    # minute of wall time. asyncio's timers run on the monotonic clock, which
+    # stands still during suspend and ignores clock and timezone changes, so
+    # each tick re-aligns to time.time() and logind/timedated signals force
+    # a tick straight away. Publishes the current minute as a datetime.
+    def __init__(self):
+        super().__init__()
+        self._timer = None
+        self._watching = False
+
+    def start(self):
+        self.value = self._now()
+        self._schedule()
+        if not self._watching:
+            self._watching = True
+            asyncio.get_running_loop().create_task(self._watch_signals())
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def tick(self):
+        self.publish(self._now())
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = 60 - time.time() % 60 + CLOCK_SLACK
+        self._timer = asyncio.get_running_loop().call_later(delay, self.tick)
+
+    @staticmethod
+    def _now():
+        # Picks up a changed /etc/localtime or TZ
+        time.tzset()
+        return datetime.datetime.now().replace(second=0, microsecond=0)
+
+    def _on_resume(self, message):
+        # PrepareForSleep(false) is sent on the way back up
+        if not message.body[0] and self._subscribers:
+            self.tick()
+
+    def _on_timezone(self, _message):
+        if self._subscribers:
+            self.tick()
+
+    async def _watch_signals(self):
+        try:
+            from libqtile.utils import add_signal_receiver
+        except ImportError:
+            return
+
+        await add_signal_receiver(
+            self._on_resume,
+            session_bus=False,
+            signal_name="PrepareForSleep",
+            dbus_interface="org.freedesktop.login1.Manager",
+        )
+        await add_signal_receiver(
+            self._on_timezone,
+            session_bus=False,
+            signal_name="PropertiesChanged",
+            dbus_interface="org.freedesktop.DBus.Properties",
+            path="/org/freedesktop/timedate1",
+        )
+
+
+provider = ClockProvider()
+
+
+def get_date(value):
+    if value is None:
+        return ""
+    return value.strftime(DATE_FORMAT)
+
+
+def get_time(value):
+    if value is None:
+        return ""
+    return value.strftime(TIME_FORMAT)
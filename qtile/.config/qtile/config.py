@@ -1,3 +1,8 @@
+import profiling
+
+# With QTILE_PROFILE set, time every import and section from here on
+profiling.start_startup()
+
 import os
 from libqtile import layout, qtile, hook, bar, widget as defaultWidget
 from libqtile.config import Click, Drag, Group, Key, Match, Screen
@@ -11,6 +16,7 @@ from qtile_extras import widget
 from colors import colors
 
 from widgets import (
+    ProviderText,
     dateWidget,
     timeWidget,
     weatherWidget,
@@ -19,6 +25,14 @@ from widgets import (
     volumeWidget,
     brightnessWidget,
 )
+from controls import change_brightness, change_volume, toggle_mute
+from screens import (
+    move_floating_to_next_screen,
+    move_group_to_next_screen,
+    move_to_next_screen,
+    screen_index,
+)
+import randr
 import subprocess
 
 
@@ -28,16 +42,15 @@ def autostart():
     subprocess.Popen(["bash", home])
 
 
-@hook.subscribe.screen_change
-def autorandr(_event):
-    subprocess.run(["autorandr", "--change"])
+@hook.subscribe.startup_complete
+def startup_complete():
+    profiling.mark("startup_complete")
 
 
-def move_to_next_screen(qtile):
-    if qtile.current_window:
-        i = qtile.screens.index(qtile.current_screen)
-        dest = (i + 1) % len(qtile.screens)
-        qtile.current_window.toscreen(dest)
+@hook.subscribe.screen_change
+def autorandr(event):
+    # Debounced and run off the event loop; see randr.py
+    randr.pipeline.on_screen_change(event)
 
 
 class ActiveMonitor(widget.TextBox):
@@ -55,16 +68,21 @@ class ActiveMonitor(widget.TextBox):
         hook.unsubscribe.startup_complete(self.update_text)
         super().finalize()
 
+    @profiling.timed("hook.current_screen_change")
     def update_text(self, *args, draw=True):
         try:
             if self.qtile.current_screen:
-                idx = self.qtile.screens.index(self.qtile.current_screen)
-                self.text = chr(ord("A") + idx)
+                idx = screen_index(self.qtile)
+                text = chr(ord("A") + idx)
             else:
-                self.text = "A"
+                text = "A"
 
             if draw:
-                self.bar.draw()
+                # No-op when the letter is unchanged; otherwise repaints just
+                # this widget unless its width changed
+                self.update(text)
+            else:
+                self.text = text
         except Exception:
             pass
 
@@ -128,6 +146,18 @@ keys = [
         lazy.function(move_to_next_screen),
         desc="Move focus window to next monitor",
     ),
+    Key(
+        [mod, "control"],
+        "Tab",
+        lazy.function(move_group_to_next_screen),
+        desc="Move all windows of the group to next monitor",
+    ),
+    Key(
+        [mod, "control", "shift"],
+        "Tab",
+        lazy.function(move_floating_to_next_screen),
+        desc="Move floating windows to next monitor",
+    ),
     Key([mod], "w", lazy.window.kill(), desc="Kill focused window"),
     Key(
         [mod],
@@ -143,6 +173,12 @@ keys = [
     # ),
     Key([mod, "control"], "u", lazy.reload_config(), desc="Reload the config"),
     Key([mod, "control"], "q", lazy.shutdown(), desc="Shutdown Qtile"),
+    Key(
+        [mod, "control"],
+        "p",
+        lazy.function(profiling.dump_profile),
+        desc="Dump bar and hook timings (QTILE_PROFILE=1)",
+    ),
     Key(
         [mod, "control"],
         "l",
@@ -161,25 +197,31 @@ keys = [
     Key(
         [],
         "XF86AudioRaiseVolume",
-        lazy.spawn("pactl set-sink-volume @DEFAULT_SINK@ +2%"),
+        lazy.function(change_volume, 2),
         desc="Volume up",
     ),
     Key(
         [],
         "XF86AudioLowerVolume",
-        lazy.spawn("pactl set-sink-volume @DEFAULT_SINK@ -2%"),
+        lazy.function(change_volume, -2),
         desc="Volume down",
     ),
+    Key(
+        [],
+        "XF86AudioMute",
+        lazy.function(toggle_mute),
+        desc="Toggle mute",
+    ),
     Key(
         [mod],
         "XF86AudioRaiseVolume",
-        lazy.spawn("brightnessctl set 5%+"),
+        lazy.function(change_brightness, 5),
         desc="Increase brightness",
     ),
     Key(
         [mod],
         "XF86AudioLowerVolume",
-        lazy.spawn("brightnessctl set 5%-"),
+        lazy.function(change_brightness, -5),
         desc="Decrease brightness",
     ),
     # --- Dunst Shortcuts ---
@@ -286,7 +328,31 @@ powerLine = {
 }
 
 
-def init_bar(systray=False):
+# Built once and placed in every bar. qtile swaps any widget instance that is
+# already configured in another bar for a Mirror that copies its drawing, so
+# extra monitors add no polling or subprocesses of their own. A value change
+# repaints the mirrors in place; only a change of width re-lays out the
+# other bars (see ProviderText._draw_with_mirrors).
+with profiling.section("status_widgets"):
+    status_widgets = (
+        batteryWidget()
+        + volumeWidget()
+        + brightnessWidget()
+        + weatherWidget()
+        + dateWidget()
+        + timeWidget()
+    )
+for position, status_widget in enumerate(status_widgets):
+    # Provider texts are labelled after their render function (get_time, ...),
+    # icons and separators after their place in the bar
+    if isinstance(status_widget, ProviderText):
+        label = status_widget.render.__name__
+    else:
+        label = f"{status_widget.name}{position}"
+    profiling.instrument_widget(status_widget, label)
+
+
+def init_bar(name, systray=False):
     tray = Systray() if systray else []
 
     widgets_list = (
@@ -305,30 +371,32 @@ def init_bar(systray=False):
             ),
         ]
         + tray
-        + batteryWidget()
-        + volumeWidget()
-        + brightnessWidget()
-        + weatherWidget()
-        + dateWidget()
-        + timeWidget()
+        + status_widgets
     )
-    return bar.Bar(
-        widgets_list,
-        35,
-        margin=[5, 8, 3, 8],
-        background=colors["black"],
+    return profiling.instrument_bar(
+        bar.Bar(
+            widgets_list,
+            35,
+            margin=[5, 8, 3, 8],
+            background=colors["black"],
+        ),
+        name,
     )
 
 
+with profiling.section("bars"):
+    primary_bar = init_bar("primary", systray=True)
+    secondary_bar = init_bar("secondary", systray=False)
+
 screens = [
     Screen(
-        top=init_bar(systray=True),
+        top=primary_bar,
         background=colors["black"],
         wallpaper="~/Downloads/dark mode ver 1.png",
         wallpaper_mode="fill",
     ),
     Screen(
-        top=init_bar(systray=False),
+        top=secondary_bar,
         background=colors["black"],
         wallpaper="~/Downloads/dark mode ver 1.png",
         wallpaper_mode="fill",
@@ -370,7 +438,8 @@ floating_layout = layout.Floating(
 auto_fullscreen = True
 focus_on_window_activation = "smart"
 focus_previous_on_window_remove = False
-reconfigure_screens = True
+# randr.pipeline reconfigures the screens itself once the profile switch is done
+reconfigure_screens = False
 
 # If things like steam games want to auto-minimize themselves when losing
 # focus, should we respect this or not?
@@ -392,3 +461,5 @@ wl_xcursor_size = 24
 # We choose LG3D to maximize irony: it is a 3D non-reparenting WM written in
 # java that happens to be on java's whitelist.
 wmname = "LG3D"
+
+profiling.end_startup()
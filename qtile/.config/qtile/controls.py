@@ -0,0 +1,102 @@
+import asyncio
+import subprocess
+
+import audio
+import backlight
+
+# Key repeats less than this far apart are applied as one change, and a
+# held key still applies at least once per COALESCE_MAX_DELAY (seconds)
+COALESCE_DELAY = 0.05
+COALESCE_MAX_DELAY = 0.25
+
+
+class _Coalescer:
+    # Sums the deltas of rapid key repeats and hands them to `apply` in one go
+    def __init__(self, apply):
+        self.apply = apply
+        self.pending = 0
+        self._handle = None
+        self._deadline = None
+
+    def add(self, delta):
+        self.pending += delta
+        loop = asyncio.get_running_loop()
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._deadline is None:
+            self._deadline = loop.time() + COALESCE_MAX_DELAY
+        self._handle = loop.call_at(
+            min(loop.time() + COALESCE_DELAY, self._deadline), self._flush
+        )
+
+    def _flush(self):
+        self._handle = None
+        self._deadline = None
+        delta, self.pending = self.pending, 0
+        if delta:
+            self.apply(delta)
+
+
+def _apply_brightness(delta):
+    device = backlight.provider.device
+    if device is not None:
+        try:
+            backlight.step_brightness(device, delta)
+            return
+        except (OSError, ValueError):
+            pass
+
+    # No write access to sysfs; brightnessctl can still go through logind
+    sign = "+" if delta > 0 else "-"
+    subprocess.Popen(["brightnessctl", "-q", "set", f"{abs(delta)}%{sign}"])
+
+
+def _apply_volume(delta):
+    async def change():
+        try:
+            await audio.provider.change(delta)
+        except Exception:
+            audio.provider.disconnect()
+            sign = "+" if delta > 0 else "-"
+            subprocess.Popen(
+                ["pactl", "set-sink-volume", "@DEFAULT_SINK@", f"{sign}{abs(delta)}%"]
+            )
+
+    asyncio.get_running_loop().create_task(change())
+
+
+_brightness = _Coalescer(_apply_brightness)
+_volume = _Coalescer(_apply_volume)
+
+
+def change_brightness(qtile, step):
+    # The bar shows the new value on the key press itself; the sysfs write
+    # follows once the repeats settle
+    value = backlight.provider.value
+    if value is not None:
+        backlight.provider.publish(max(0, min(100, value + step)))
+    _brightness.add(step)
+
+
+def change_volume(qtile, step):
+    value = audio.provider.value
+    if value is not None:
+        volume, muted = value
+        audio.provider.publish((max(0, volume + step), muted))
+    _volume.add(step)
+
+
+def toggle_mute(qtile):
+    value = audio.provider.value
+    if value is not None:
+        volume, muted = value
+        audio.provider.publish((volume, not muted))
+
+    async def toggle():
+        try:
+            await audio.provider.toggle_mute()
+        except Exception:
+            audio.provider.disconnect()
+            subprocess.Popen(["pactl", "set-sink-mute", "@DEFAULT_SINK@", "toggle"])
+
+    asyncio.get_running_loop().create_task(toggle())
@@ -0,0 +1,109 @@
+import os
+
+import fswatch
+from providers import Provider
+
+ENV_PATH = os.path.expanduser("~/.config/qtile/.env")
+
+# Saving the file in place or by rename (most editors), or removing it
+_CHANGE_MASK = fswatch.IN_CLOSE_WRITE | fswatch.IN_MOVED_TO | fswatch.IN_DELETE
+
+
+def parse(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                k, v = line.split("=", 1)
+                values[k.strip()] = v.strip()
+    return values
+
+
+class _Key(Provider):
+    # One variable of an EnvFile; subscribers hear when its value changes
+    def __init__(self, env, name):
+        super().__init__()
+        self.env = env
+        self.name = name
+
+    def start(self):
+        self.value = os.environ.get(self.name)
+        self.env._watch()
+
+    def stop(self):
+        self.env._unwatch()
+
+
+class EnvFile:
+    # KEY=value secrets exported into os.environ. Variables set in the real
+    # environment win, as before; values that came from the file follow it.
+    # The parse is cached on the file's inode, mtime and size, and while any
+    # key() has subscribers the directory is watched so an edit is applied
+    # without restarting qtile.
+    def __init__(self, path=ENV_PATH):
+        self.path = path
+        self.values = {}
+        self._stamp = None
+        self._exported = {}
+        self._keys = {}
+        self._watcher = None
+        self._watching = 0
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            stamp = None
+        else:
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        if stamp != self._stamp:
+            self.values = parse(self.path) if stamp is not None else {}
+            self._stamp = stamp
+        return self.values
+
+    def load(self):
+        values = self.read()
+        for k in list(self._exported):
+            if k not in values and os.environ.get(k) == self._exported.pop(k):
+                del os.environ[k]
+        for k, v in values.items():
+            if k not in os.environ or os.environ[k] == self._exported.get(k):
+                os.environ[k] = v
+                self._exported[k] = v
+        return values
+
+    def key(self, name):
+        if name not in self._keys:
+            self._keys[name] = _Key(self, name)
+        return self._keys[name]
+
+    def _watch(self):
+        self._watching += 1
+        if self._watcher is not None:
+            return
+        try:
+            self._watcher = fswatch.Watcher(self._on_change)
+            self._watcher.add(os.path.dirname(self.path), _CHANGE_MASK)
+        except OSError:
+            # No inotify or no config directory; changes need a restart
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+    def _unwatch(self):
+        self._watching -= 1
+        if not self._watching and self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def _on_change(self, _path, _mask, name):
+        if name != os.path.basename(self.path):
+            return
+        self.load()
+        for key in list(self._keys.values()):
+            key.publish(os.environ.get(key.name))
+
+
+dotenv = EnvFile()
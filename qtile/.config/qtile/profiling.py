@@ -0,0 +1,193 @@
+import builtins
+import contextlib
+import functools
+import inspect
+import os
+import sys
+import time
+
+# Start qtile with QTILE_PROFILE=1 in its environment to collect timings.
+# When unset every helper here hands back what it was given untouched.
+ENABLED = bool(os.environ.get("QTILE_PROFILE"))
+
+PROFILE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "qtile",
+    "profile.json",
+)
+
+# Upper bucket edges of the duration histograms (in milliseconds)
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_started = time.time()
+_timings = {}
+_counters = {}
+
+_startup_begin = None
+_real_import = None
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        for i, edge in enumerate(BUCKETS):
+            if ms <= edge:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self):
+        labels = [f"<={edge}ms" for edge in BUCKETS] + [f">{BUCKETS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0,
+            "max_ms": round(self.max, 3),
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+def record(name, ms):
+    if name not in _timings:
+        _timings[name] = _Histogram()
+    _timings[name].add(ms)
+
+
+def count(name):
+    _counters[name] = _counters.get(name, 0) + 1
+
+
+def timed(name):
+    # Decorator recording how long each call takes under `name`. Works on
+    # plain functions and coroutines (the latter including time spent
+    # awaiting, e.g. a network fetch).
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    record(name, (time.perf_counter() - start) * 1000)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+
+        return wrapper
+
+    return decorator
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only first-time absolute imports cost anything worth reporting. Times
+    # are inclusive: a package's own imports are counted again under it.
+    if level or name in sys.modules:
+        return _real_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _real_import(name, globals, locals, fromlist, level)
+    finally:
+        record(f"import.{name}", (time.perf_counter() - start) * 1000)
+
+
+def start_startup():
+    # Called at the very top of config.py; times every import that follows
+    global _startup_begin, _real_import
+    if not ENABLED or _real_import is not None:
+        return
+    _startup_begin = time.perf_counter()
+    _real_import = builtins.__import__
+    builtins.__import__ = _timed_import
+
+
+def end_startup():
+    # Called at the bottom of config.py
+    global _real_import
+    if _real_import is None:
+        return
+    builtins.__import__ = _real_import
+    _real_import = None
+    mark("config")
+
+
+def mark(name):
+    # Time from start_startup() to now, e.g. for startup_complete
+    if ENABLED and _startup_begin is not None:
+        record(f"startup.{name}", (time.perf_counter() - _startup_begin) * 1000)
+
+
+@contextlib.contextmanager
+def section(name):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(f"section.{name}", (time.perf_counter() - start) * 1000)
+
+
+def instrument_bar(bar, name):
+    # Bar.draw() only queues a redraw; _actual_draw() does the painting
+    if ENABLED:
+        draw = bar.draw
+        actual_draw = bar._actual_draw
+
+        def counted_draw():
+            count(f"bar.{name}.draw_requests")
+            draw()
+
+        bar.draw = counted_draw
+        bar._actual_draw = timed(f"bar.{name}.redraw")(actual_draw)
+    return bar
+
+
+def instrument_widget(widget, label):
+    # Times the widget's own poll (InLoopPollText/ThreadPoolText) and draws
+    # under `label`. widget.name is no use here: qtile only makes duplicate
+    # names unique once the bars are configured.
+    if ENABLED:
+        if callable(getattr(widget, "poll", None)):
+            widget.poll = timed(f"poll.{label}")(widget.poll)
+        widget.draw = timed(f"draw.{label}")(widget.draw)
+    return widget
+
+
+def snapshot():
+    return {
+        "enabled": ENABLED,
+        "uptime_s": round(time.time() - _started, 1),
+        "timings": {name: h.as_dict() for name, h in sorted(_timings.items())},
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def dump_profile(qtile=None, path=PROFILE_PATH):
+    # Bound to a key in config.py via lazy.function
+    import json
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    return path
@@ -0,0 +1,33 @@
+class Provider:
+    # A single data source shared by every widget on every bar. Widgets
+    # subscribe when configured and unsubscribe on finalize; the source only
+    # runs while someone is listening and subscribers only hear about values
+    # that actually changed.
+    def __init__(self):
+        self.value = None
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if len(self._subscribers) == 1:
+            self.start()
+
+    def unsubscribe(self, callback):
+        if callback not in self._subscribers:
+            return
+        self._subscribers.remove(callback)
+        if not self._subscribers:
+            self.stop()
+
+    def publish(self, value):
+        if value == self.value:
+            return
+        self.value = value
+        for callback in list(self._subscribers):
+            callback(value)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,418 @@
+import asyncio
+import os
+import time
+
+from libqtile import qtile
+from libqtile.log_utils import logger
+
+import profiling
+
+# RandR events arriving within this window are handled as one change (seconds)
+SCREEN_CHANGE_DEBOUNCE = 0.5
+
+# Profiles saved with `autorandr --save` are read from here, and again
+# whenever one of them is saved or removed
+AUTORANDR_DIR = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "autorandr"
+)
+
+# RandR rotation bits for autorandr's `rotate` values
+ROTATIONS = {"normal": 1, "left": 2, "inverted": 4, "right": 8}
+
+# autorandr keys that need nothing from us when left at their defaults
+_IDENTITY = {
+    "transform": "1,0,0,0,1,0,0,0,1",
+    "scale": "1x1",
+    "reflect": "normal",
+    "panning": "0x0",
+}
+_IGNORED = {"dpi", "gamma", "filter"}
+
+# autorandr scripts run around a switch, in a profile directory or in
+# AUTORANDR_DIR itself, either as a file or as a "<hook>.d" directory.
+# Only autorandr runs them, so profiles with hooks are left to it.
+_HOOKS = ("predetect", "preswitch", "postswitch")
+
+
+def _parse_setup(path):
+    # "<output> <edid hex>" per connected output
+    setup = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            output, edid = parts
+            if "*" in edid or "?" in edid:
+                raise ValueError("wildcard fingerprints are left to autorandr")
+            setup[output] = edid.lower()
+    return frozenset(setup.items())
+
+
+def _parse_config(path):
+    outputs = {}
+    current = None
+    with open(path) as f:
+        for line in f:
+            parts = line.split(None, 1)
+            if not parts:
+                continue
+            key = parts[0]
+            value = parts[1].strip() if len(parts) > 1 else ""
+
+            if key == "output":
+                current = outputs[value] = {
+                    "mode": None,
+                    "pos": (0, 0),
+                    "rate": None,
+                    "rotation": ROTATIONS["normal"],
+                    "primary": False,
+                    "crtc": None,
+                }
+            elif current is None or key in _IGNORED or key.startswith("x-prop"):
+                continue
+            elif key == "off":
+                current["mode"] = None
+            elif key == "mode":
+                width, height = value.split("x", 1)
+                current["mode"] = (int(width), int(height.rstrip("i")))
+            elif key == "pos":
+                x, y = value.split("x", 1)
+                current["pos"] = (int(x), int(y))
+            elif key == "rate":
+                current["rate"] = float(value)
+            elif key == "rotate":
+                current["rotation"] = ROTATIONS[value]
+            elif key == "primary":
+                current["primary"] = True
+            elif key == "crtc":
+                current["crtc"] = int(value)
+            elif _IDENTITY.get(key) != value:
+                raise ValueError(f"{key} {value} is left to autorandr")
+    return outputs
+
+
+# Non-zero SetConfig statuses of a SetCrtcConfig reply
+_SET_CONFIG_ERRORS = {1: "InvalidConfigTime", 2: "InvalidTime", 3: "Failed"}
+
+
+def _set_crtc_config(randr, crtc, *args):
+    # RandR reports a refused change in the reply's status, not as an X
+    # error, so check it; the caller falls back to autorandr on the raise
+    status = randr.SetCrtcConfig(crtc, *args).reply().status
+    if status:
+        raise RuntimeError(
+            f"SetCrtcConfig on CRTC {crtc}: {_SET_CONFIG_ERRORS.get(status, status)}"
+        )
+
+
+def _has_hooks(path):
+    return any(
+        os.path.exists(os.path.join(path, hook))
+        or os.path.exists(os.path.join(path, hook + ".d"))
+        for hook in _HOOKS
+    )
+
+
+def load_profiles(root=AUTORANDR_DIR):
+    # EDID fingerprint -> (profile name, output layout), or None for a
+    # profile only autorandr can apply
+    index = {}
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return index
+    if _has_hooks(root):
+        # Global hooks run for every profile
+        return index
+
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            fingerprint = _parse_setup(os.path.join(path, "setup"))
+            if _has_hooks(path):
+                index.setdefault(fingerprint, None)
+                continue
+            outputs = _parse_config(os.path.join(path, "config"))
+        except (OSError, ValueError, KeyError):
+            continue
+        index.setdefault(fingerprint, (name, outputs))
+    return index
+
+
+def _profiles_stamp(root=AUTORANDR_DIR):
+    # Changes when a profile is saved (setup and config are rewritten),
+    # added, removed, or gains or loses a hook
+    try:
+        stamp = [os.stat(root).st_mtime_ns]
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(root, name)
+        for entry in (path, os.path.join(path, "setup"), os.path.join(path, "config")):
+            try:
+                stamp.append((entry, os.stat(entry).st_mtime_ns))
+            except OSError:
+                stamp.append((entry, None))
+    return tuple(stamp)
+
+
+class DisplayProfiles:
+    # Matches the connected monitors against the autorandr profiles and
+    # applies the layout over RandR directly, without spawning autorandr and
+    # xrandr. The profiles are re-read only when their files changed, which
+    # costs a few stat() calls per hotplug. Blocking; run it off the event
+    # loop. Keeps its own X connection.
+    def __init__(self, root=AUTORANDR_DIR):
+        self.root = root
+        self._index = None
+        self._stamp = None
+        self._conn = None
+
+    @property
+    def index(self):
+        # Read on the first screen change rather than while qtile starts, and
+        # only from apply() so the reads stay off the event loop
+        stamp = _profiles_stamp(self.root)
+        if self._index is None or stamp != self._stamp:
+            self._index = load_profiles(self.root)
+            self._stamp = stamp
+        return self._index
+
+    def _connect(self):
+        if self._conn is None:
+            import xcffib
+            import xcffib.randr
+
+            conn = xcffib.connect(display=os.environ.get("DISPLAY"))
+            self._randr = conn(xcffib.randr.key)
+            self._randr.QueryVersion(1, 3).reply()
+            self._root = conn.get_setup().roots[conn.pref_screen].root
+            self._edid = conn.core.InternAtom(False, 4, "EDID").reply().atom
+            self._conn = conn
+        return self._randr
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.disconnect()
+            self._conn = None
+
+    def _outputs(self, res):
+        outputs = {}
+        for output in res.outputs:
+            info = self._randr.GetOutputInfo(output, res.config_timestamp).reply()
+            outputs[info.name.to_string()] = (output, info)
+        return outputs
+
+    def _fingerprint(self, outputs):
+        fingerprint = set()
+        for name, (output, info) in outputs.items():
+            # 0 is RandR's Connection.Connected
+            if info.connection != 0:
+                continue
+            prop = self._randr.GetOutputProperty(
+                output, self._edid, 0, 0, 256, False, False
+            ).reply()
+            fingerprint.add((name, prop.data.buf().hex()))
+        return frozenset(fingerprint)
+
+    @staticmethod
+    def _modes(res):
+        names = res.names.buf()
+        modes = {}
+        offset = 0
+        for mode in res.modes:
+            name = names[offset : offset + mode.name_len].decode()
+            offset += mode.name_len
+            rate = 0
+            if mode.htotal and mode.vtotal:
+                rate = mode.dot_clock / (mode.htotal * mode.vtotal)
+            modes[mode.id] = (name, mode.width, mode.height, rate)
+        return modes
+
+    def apply(self):
+        # Returns the applied profile's name, or None when no profile matches
+        # (or the match has hooks) and the caller should fall back to autorandr
+        index = self.index
+        if not index:
+            return None
+        randr = self._connect()
+        res = randr.GetScreenResourcesCurrent(self._root).reply()
+        outputs = self._outputs(res)
+        match = index.get(self._fingerprint(outputs))
+        if match is None:
+            return None
+        name, layout = match
+
+        modes = self._modes(res)
+        wanted = {}
+        primary = 0
+        width = height = 0
+        taken = set()
+        for output_name, target in layout.items():
+            if target["mode"] is None or output_name not in outputs:
+                continue
+            output, info = outputs[output_name]
+
+            candidates = [
+                m
+                for m in info.modes
+                if m in modes and modes[m][1:3] == target["mode"]
+            ]
+            if not candidates:
+                return None
+            if target["rate"] is not None:
+                candidates.sort(key=lambda m: abs(modes[m][3] - target["rate"]))
+            mode = candidates[0]
+
+            crtcs = list(info.crtcs)
+            if target["crtc"] is not None and target["crtc"] < len(res.crtcs):
+                crtcs.insert(0, res.crtcs[target["crtc"]])
+            if info.crtc:
+                crtcs.insert(0, info.crtc)
+            crtc = next((c for c in crtcs if c in info.crtcs and c not in taken), None)
+            if crtc is None:
+                return None
+            taken.add(crtc)
+
+            x, y = target["pos"]
+            w, h = target["mode"]
+            if target["rotation"] in (ROTATIONS["left"], ROTATIONS["right"]):
+                w, h = h, w
+            width = max(width, x + w)
+            height = max(height, y + h)
+            wanted[crtc] = (x, y, mode, target["rotation"], (output,))
+            if target["primary"]:
+                primary = output
+
+        if not wanted:
+            return None
+
+        current = {}
+        for crtc in res.crtcs:
+            info = randr.GetCrtcInfo(crtc, res.config_timestamp).reply()
+            if info.mode:
+                outputs_on = tuple(info.outputs)
+                current[crtc] = (info.x, info.y, info.mode, info.rotation, outputs_on)
+
+        if current == wanted:
+            return name
+
+        # Switch off everything that changes first so the new screen size
+        # never has to contain a stale CRTC
+        for crtc in current:
+            if current[crtc] != wanted.get(crtc):
+                _set_crtc_config(
+                    randr,
+                    crtc,
+                    0,
+                    res.config_timestamp,
+                    0,
+                    0,
+                    0,
+                    ROTATIONS["normal"],
+                    0,
+                    [],
+                )
+
+        # Keep the reported DPI at 96
+        randr.SetScreenSize(
+            self._root,
+            width,
+            height,
+            round(width * 25.4 / 96),
+            round(height * 25.4 / 96),
+        )
+
+        for crtc, (x, y, mode, rotation, crtc_outputs) in wanted.items():
+            if current.get(crtc) == wanted[crtc]:
+                continue
+            _set_crtc_config(
+                randr,
+                crtc,
+                0,
+                res.config_timestamp,
+                x,
+                y,
+                mode,
+                rotation,
+                len(crtc_outputs),
+                list(crtc_outputs),
+            )
+
+        if primary:
+            randr.SetOutputPrimary(self._root, primary)
+        self._conn.flush()
+        return name
+
+
+class ScreenChangePipeline:
+    # Hotplugging fires a burst of screen_change events. Wait for the burst
+    # to settle, switch the display profile without blocking the event loop,
+    # and only then ask qtile to rebuild its screens, once.
+    def __init__(self, profiles=None, debounce=SCREEN_CHANGE_DEBOUNCE):
+        self.profiles = profiles
+        self.debounce = debounce
+        self._timer = None
+        self._task = None
+        self._pending = False
+
+    def on_screen_change(self, *_args):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.debounce, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        if self._task is not None and not self._task.done():
+            # Run once more when the current switch is done
+            self._pending = True
+            return
+        self._task = asyncio.get_running_loop().create_task(self._switch())
+
+    @profiling.timed("hook.screen_change")
+    async def _switch(self):
+        started = time.monotonic()
+        await self.apply_profile()
+        switched = time.monotonic()
+        qtile.reconfigure_screens()
+        done = time.monotonic()
+
+        logger.info(
+            "screen change: profile switch %.0f ms, reconfigure %.0f ms",
+            (switched - started) * 1000,
+            (done - switched) * 1000,
+        )
+
+        if self._pending:
+            self._pending = False
+            self._fire()
+
+    async def apply_profile(self):
+        if self.profiles is not None:
+            loop = asyncio.get_running_loop()
+            try:
+                name = await loop.run_in_executor(None, self.profiles.apply)
+            except Exception:
+                logger.exception("native profile switch failed")
+                self.profiles.close()
+                name = None
+            if name is not None:
+                logger.info("screen change: applied display profile %s", name)
+                return
+
+        # Wildcard fingerprints, unknown monitors and exotic settings
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "autorandr",
+                "--change",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await proc.wait()
+        except OSError:
+            logger.exception("autorandr failed to run")
+
+
+pipeline = ScreenChangePipeline(DisplayProfiles())
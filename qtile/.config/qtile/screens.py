@@ -0,0 +1,58 @@
+import contextlib
+
+
+def screen_index(qtile, screen=None):
+    # qtile numbers its screens whenever it (re)configures them, so unlike
+    # qtile.screens.index() this is O(1) and still right after a hotplug
+    if screen is None:
+        screen = qtile.current_screen
+    return screen.index
+
+
+def next_screen(qtile, offset=1):
+    return qtile.screens[(screen_index(qtile) + offset) % len(qtile.screens)]
+
+
+def _skip_layout(*_args, **_kwargs):
+    pass
+
+
+@contextlib.contextmanager
+def one_layout_pass(*groups):
+    # Group.add() and Group.remove() lay the group out again for every
+    # window. Hold that off while a batch moves, then lay each group out
+    # once.
+    for group in groups:
+        group.layout_all = _skip_layout
+    try:
+        yield
+    finally:
+        for group in groups:
+            del group.layout_all
+            group.layout_all()
+
+
+def _move_windows(qtile, windows, offset):
+    if len(qtile.screens) < 2 or not windows:
+        return
+    source = qtile.current_group
+    target = next_screen(qtile, offset).group
+    with one_layout_pass(source, target):
+        for win in windows:
+            win.togroup(target.name)
+
+
+def move_to_next_screen(qtile):
+    if qtile.current_window:
+        qtile.current_window.toscreen(screen_index(qtile, next_screen(qtile)))
+
+
+def move_group_to_next_screen(qtile):
+    # Every window of the current group joins the group shown on the next
+    # screen
+    _move_windows(qtile, list(qtile.current_group.windows), 1)
+
+
+def move_floating_to_next_screen(qtile):
+    windows = [win for win in qtile.current_group.windows if win.floating]
+    _move_windows(qtile, windows, 1)
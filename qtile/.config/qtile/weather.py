@@ -0,0 +1,495 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import re
+import time
+
+import env
+import profiling
+from providers import Provider
+
+logger = logging.getLogger("libqtile")
+
+# Global variable for weather updates (in seconds)
+WEATHER_UPDATE_INTERVAL = 600
+
+# How long each source may take before the next one is tried (in seconds)
+WEATHER_TIMEOUT = 10
+
+# Override with WEATHER_URL in .env to point the bar at a local stub server
+WEATHER_URL = (
+    "https://api.openweathermap.org/data/2.5/weather"
+    "?lat={lat}&lon={lon}&appid={key}&units=metric"
+)
+WEATHER_LAT = "53.5461"
+WEATHER_LON = "-113.4938"
+
+# Environment Canada city page for the same place (Edmonton); no key needed
+WEATHER_EC_URL = "https://dd.weather.gc.ca/citypage_weather/xml/AB/s0000045_e.xml"
+
+# Sources tried in order until one answers; see get_sources()
+WEATHER_SOURCE_ORDER = "owm,ec"
+
+# Last good result, kept on disk so restarts and reloads paint immediately.
+# Bump WEATHER_CACHE_VERSION whenever the stored value changes shape.
+WEATHER_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "qtile",
+    "weather.json",
+)
+WEATHER_CACHE_VERSION = 1
+# Older entries are too stale to show at all (in seconds)
+WEATHER_CACHE_TTL = 6 * 60 * 60
+
+# Retry delays after failed fetches double from WEATHER_BACKOFF_BASE up to
+# WEATHER_BACKOFF_MAX, with jitter (in seconds). After
+# WEATHER_FAILURE_THRESHOLD failures in a row the circuit opens: no request
+# goes out until the backoff runs out, then a single trial (half-open).
+WEATHER_BACKOFF_BASE = 30
+WEATHER_BACKOFF_MAX = 30 * 60
+WEATHER_FAILURE_THRESHOLD = 3
+
+# NetworkManager's NM_STATE_CONNECTED_GLOBAL
+NM_STATE_CONNECTED_GLOBAL = 70
+
+WEATHER_ICONS = {
+    "default": "",
+    "sun": "󰖙",
+    "cloud": "󰖐",
+    "rain": "󰖖",
+    "snow": "󰼶",
+    "fog": "󰖑",
+}
+
+
+# OpenWeatherMap condition codes, https://openweathermap.org/weather-conditions
+# Checked before the description text, which is only a fallback.
+_CONDITION_IDS = {
+    **{i: "rain" for i in range(200, 300)},  # Thunderstorm
+    **{i: "rain" for i in range(300, 400)},  # Drizzle
+    **{i: "rain" for i in range(500, 600)},  # Rain
+    511: "snow",  # Freezing rain
+    **{i: "snow" for i in range(600, 700)},  # Snow, sleet
+    **{i: "fog" for i in range(700, 800)},  # Mist, smoke, haze, dust, ash...
+    771: "snow",  # Squalls, as the text path has always treated them
+    781: "default",  # Tornado
+    800: "sun",
+    **{i: "cloud" for i in range(801, 900)},
+}
+
+# Text fallback for descriptions without a code (e.g. Environment Canada).
+# Categories are listed by priority and every one is tried at each position
+# through a lookahead, so one search finds the same winner the old chain of
+# substring scans did:
+# 1. Snow / Ice / Winter: Light Snow, Flurries, Ice Crystals, Freezing Rain, Hail
+# 2. Rain / Liquid Precipitation: Rain, Drizzle, Showers, Thunderstorm
+# 3. Fog / Visibility / Atmosphere: Fog, Mist, Haze, Smoke, Volcanic Ash
+# 4. Clouds: Cloudy, Mostly Cloudy, Overcast, A mix of sun and cloud
+# 5. Sun / Clear: Sunny, Mainly Sunny, Clear, Mainly Clear
+_CONDITION_TERMS = {
+    "snow": ["snow", "flurr", "ice", "hail", "freezing", "squall", "drift", "blow"],
+    "rain": ["rain", "shower", "drizzle", "thunder", "storm"],
+    "fog": ["fog", "mist", "haze", "smoke", "ash"],
+    "cloud": ["cloud", "overcast", "gloom"],
+    "sun": ["sun", "clear"],
+}
+_CONDITION_PRIORITY = {name: i for i, name in enumerate(_CONDITION_TERMS)}
+_CONDITION_RE = re.compile(
+    "|".join(
+        f"(?=(?P<{name}>{'|'.join(terms)}))"
+        for name, terms in _CONDITION_TERMS.items()
+    )
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _classify_text(condition_text):
+    best = None
+    for match in _CONDITION_RE.finditer(condition_text.lower()):
+        name = match.lastgroup
+        if best is None or _CONDITION_PRIORITY[name] < _CONDITION_PRIORITY[best]:
+            best = name
+            if _CONDITION_PRIORITY[best] == 0:
+                break
+    # Fallback if text matches nothing (e.g. empty string or unknown term)
+    return best or "default"
+
+
+def get_weather_condition(condition_text, condition_id=None):
+    if condition_id in _CONDITION_IDS:
+        return WEATHER_ICONS[_CONDITION_IDS[condition_id]]
+    if not condition_text:
+        return WEATHER_ICONS["default"]
+    return WEATHER_ICONS[_classify_text(condition_text)]
+
+
+class WeatherSource:
+    # A weather backend. Subclasses build the URL and parse the response;
+    # this class does the HTTP side, including conditional GETs so an
+    # unchanged payload comes back as a bodiless 304 and the previous
+    # result is reused.
+    name = None
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.last = None
+
+    def url(self):
+        # None when the source isn't configured (e.g. no API key)
+        raise NotImplementedError
+
+    def parse(self, resp):
+        raise NotImplementedError
+
+    def fetch(self):
+        # urllib pulls in http.client, ssl and email, so it is imported on
+        # the first fetch rather than while the bar is being built
+        import urllib.error
+        import urllib.request
+
+        url = self.url()
+        if url is None:
+            return None
+
+        headers = {"User-Agent": "Mozilla/5.0"}
+        if self.last is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=WEATHER_TIMEOUT) as resp:
+                result = self.parse(resp)
+                self.etag = resp.headers.get("ETag")
+                self.last_modified = resp.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and self.last is not None:
+                return self.last
+            raise
+
+        self.last = result
+        return result
+
+
+class OpenWeatherMap(WeatherSource):
+    name = "owm"
+
+    def url(self):
+        api_key = os.getenv("WEATHER_API_KEY")
+        if not api_key:
+            return None
+        return os.getenv("WEATHER_URL", WEATHER_URL).format(
+            lat=WEATHER_LAT, lon=WEATHER_LON, key=api_key
+        )
+
+    def parse(self, resp):
+        import json
+
+        data = json.load(resp)
+        temp = data.get("main", {}).get("temp")
+        weather_list = data.get("weather", [])
+        cond = weather_list[0] if weather_list else {}
+        icon = get_weather_condition(cond.get("description", ""), cond.get("id"))
+
+        return {"temp": temp, "icon": icon}
+
+
+class EnvironmentCanada(WeatherSource):
+    # The citypage XML debug.py was written against. Only <currentConditions>
+    # is needed, and it comes before the multi-day forecast, so the parse
+    # streams the response and stops reading at its closing tag.
+    name = "ec"
+
+    def url(self):
+        return os.getenv("WEATHER_EC_URL", WEATHER_EC_URL)
+
+    def parse(self, resp):
+        import xml.etree.ElementTree as ET
+
+        temp = cond = None
+        inside = False
+        for event, elem in ET.iterparse(resp, events=("start", "end")):
+            if elem.tag != "currentConditions" and not inside:
+                continue
+            if event == "start":
+                inside = True
+            elif elem.tag == "currentConditions":
+                break
+            elif elem.tag == "temperature" and temp is None:
+                temp = elem.text
+            elif elem.tag == "condition" and cond is None:
+                cond = elem.text
+
+        if not inside:
+            raise ValueError("no currentConditions in feed")
+
+        return {
+            "temp": float(temp) if temp else None,
+            "icon": get_weather_condition(cond),
+        }
+
+
+WEATHER_SOURCES = {
+    source.name: source for source in (OpenWeatherMap, EnvironmentCanada)
+}
+
+_sources = None
+
+
+def get_sources():
+    # Tried in order on every fetch; WEATHER_SOURCES in .env (e.g. "ec,owm")
+    # changes the order or drops one
+    global _sources
+    order = os.getenv("WEATHER_SOURCES", WEATHER_SOURCE_ORDER).split(",")
+    names = [name.strip() for name in order if name.strip() in WEATHER_SOURCES]
+    # Rebuilt only when the order changes, so conditional GET state survives
+    if _sources is None or [source.name for source in _sources] != names:
+        _sources = [WEATHER_SOURCES[name]() for name in names]
+    return _sources
+
+
+@profiling.timed("poll.weather")
+async def fetch_weather():
+    # Falls over to the next source when one fails and only raises when
+    # every configured source did. Each source's blocking fetch is its own
+    # executor job with its own WEATHER_TIMEOUT, so one that hangs is
+    # abandoned and the next still gets its full turn.
+    loop = asyncio.get_running_loop()
+    error = None
+    for source in get_sources():
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(None, source.fetch), WEATHER_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "weather source %s timed out after %ss", source.name, WEATHER_TIMEOUT
+            )
+            error = TimeoutError(f"{source.name} timed out")
+            continue
+        except Exception as e:
+            logger.warning("weather source %s failed: %s", source.name, e)
+            error = e
+            continue
+        if result is not None:
+            return result
+
+    if error is not None:
+        raise error
+    return None
+
+
+def load_cache(path=WEATHER_CACHE_PATH):
+    import json
+
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get("version") != WEATHER_CACHE_VERSION:
+        return None
+    if time.time() - data.get("time", 0) > WEATHER_CACHE_TTL:
+        return None
+    return data
+
+
+def save_cache(value, updated, path=WEATHER_CACHE_PATH):
+    # Write to a sibling temp file and rename over the old one so a crash or
+    # a concurrent reader never sees a half-written cache
+    import json
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(
+                {"version": WEATHER_CACHE_VERSION, "time": updated, "value": value}, f
+            )
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+class WeatherProvider(Provider):
+    # One timer and at most one request in flight, however many bars and
+    # widgets are subscribed. Each fetch is parsed once and published as a
+    # {"temp", "icon", "age"} dict; "age" is set once the last good result
+    # is older than two intervals.
+    def __init__(self, interval=WEATHER_UPDATE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.updated = 0
+        self.last_good = None
+        self.failures = 0
+        self.circuit = "closed"
+        self._open_until = 0
+        self._timer = None
+        self._inflight = None
+        self._watching_network = False
+
+    def start(self):
+        # Serve the on-disk result straight away and only hit the network
+        # once it has gone stale (stale-while-revalidate)
+        delay = 0
+        cached = load_cache()
+        if cached is not None and cached["time"] > self.updated:
+            self.last_good = cached["value"]
+            self.updated = cached["time"]
+            self.value = self._aged()
+            delay = max(0, self.interval - (time.time() - self.updated))
+
+        env.dotenv.key("WEATHER_API_KEY").subscribe(self._on_api_key)
+        self._schedule(delay)
+        if not self._watching_network:
+            self._watching_network = True
+            asyncio.get_running_loop().create_task(self._watch_network())
+
+    def stop(self):
+        env.dotenv.key("WEATHER_API_KEY").unsubscribe(self._on_api_key)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_api_key(self, _key):
+        # A new key in .env; no need to wait out the interval or a backoff
+        # that a bad key may have caused
+        self.failures = 0
+        self.circuit = "closed"
+        self.poll()
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self.poll)
+
+    def poll(self):
+        # Also called off-schedule (network back, new API key)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.circuit == "open":
+            # The backoff has run out; let one request through
+            self.circuit = "half-open"
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        # Joins the running request if there is one, otherwise starts a new
+        # one once the last result has gone stale. Refused while the circuit
+        # is open.
+        if self._inflight is not None and not self._inflight.done():
+            return self._inflight
+
+        now = time.time()
+        if self.circuit == "open" and now < self._open_until:
+            return None
+        if not force and now - self.updated < self.interval:
+            return None
+
+        self._inflight = asyncio.get_running_loop().create_task(self._refresh(now))
+        return self._inflight
+
+    async def _refresh(self, started):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await fetch_weather()
+        except Exception as e:
+            self._failed(e)
+            return
+
+        if self._timer is None and self._subscribers:
+            self._schedule(self.interval)
+        if result is None:
+            return
+
+        self.failures = 0
+        self.circuit = "closed"
+        self.updated = started
+        self.last_good = result
+        self.publish(self._aged())
+        await loop.run_in_executor(None, save_cache, result, started)
+
+    def _failed(self, error):
+        self.failures += 1
+        delay = min(
+            WEATHER_BACKOFF_MAX, WEATHER_BACKOFF_BASE * 2 ** (self.failures - 1)
+        )
+        # Equal jitter: never retry sooner than half the backoff
+        delay = delay / 2 + random.uniform(0, delay / 2)
+
+        if self.circuit == "half-open" or self.failures >= WEATHER_FAILURE_THRESHOLD:
+            if self.circuit == "closed":
+                logger.warning(
+                    "weather: %d failures in a row (%s), retrying in %.0fs",
+                    self.failures,
+                    error,
+                    delay,
+                )
+            self.circuit = "open"
+            self._open_until = time.time() + delay
+
+        if self.last_good is not None:
+            self.publish(self._aged())
+        if self._subscribers:
+            self._schedule(delay)
+
+    def _aged(self):
+        age = time.time() - self.updated
+        if age < 2 * self.interval:
+            return dict(self.last_good, age=None)
+        if age < 60 * 60:
+            return dict(self.last_good, age=f"{int(age // 60)}m")
+        return dict(self.last_good, age=f"{int(age // 3600)}h")
+
+    def on_network_change(self, state):
+        # Retry right away when the machine comes back online rather than
+        # sitting out the rest of the backoff
+        if state != NM_STATE_CONNECTED_GLOBAL or not self._subscribers:
+            return
+        if self.failures or self.circuit != "closed":
+            self.circuit = "half-open"
+            self._open_until = 0
+            self.poll()
+
+    async def _watch_network(self):
+        try:
+            from libqtile.utils import add_signal_receiver
+        except ImportError:
+            return
+
+        def state_changed(message):
+            self.on_network_change(message.body[0])
+
+        await add_signal_receiver(
+            state_changed,
+            session_bus=False,
+            signal_name="StateChanged",
+            dbus_interface="org.freedesktop.NetworkManager",
+        )
+
+
+provider = WeatherProvider()
+
+
+def get_weather_icon(value):
+    if value is None:
+        return WEATHER_ICONS["default"]
+    return value["icon"]
+
+
+def get_weather_temp(value):
+    if value is None or value["temp"] is None:
+        return "N/A"
+    if value.get("age"):
+        # Last good reading, marked with how old it is
+        return f"{int(value['temp'])}°C ({value['age']})"
+    return f"{int(value['temp'])}°C"
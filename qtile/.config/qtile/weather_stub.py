@@ -0,0 +1,85 @@
+# Local stand-in for the weather endpoints, for checking how the bar
+# behaves with a slow or hung weather server without touching the network.
+#
+#   python weather_stub.py --delay 15
+#   WEATHER_URL=http://127.0.0.1:8765/?lat={lat}&lon={lon}&appid={key}
+#   WEATHER_EC_URL=http://127.0.0.1:8765/ec.xml
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAYLOAD = {
+    "main": {"temp": -7.4},
+    "weather": [{"id": 600, "main": "Snow", "description": "light snow"}],
+}
+
+
+# Trimmed Environment Canada city page; the forecast follows the part the
+# bar reads, as in the real feed
+EC_PAYLOAD = b"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<siteData>
+  <location><name>Edmonton</name></location>
+  <currentConditions>
+    <station>Edmonton Blatchford</station>
+    <condition>Light Snowshower</condition>
+    <temperature unitType="metric" units="C">-12.3</temperature>
+    <dewpoint unitType="metric" units="C">-15.0</dewpoint>
+  </currentConditions>
+  <forecastGroup>
+    <forecast><temperatures><temperature>-10</temperature></temperatures></forecast>
+  </forecastGroup>
+</siteData>
+"""
+
+
+def make_handler(delay, status, payload):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            if self.path.endswith(".xml"):
+                body, content_type = EC_PAYLOAD, "application/xml"
+            else:
+                body, content_type = json.dumps(payload).encode(), "application/json"
+
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            print(f"{self.address_string()} {fmt % args} (delay {delay}s)")
+
+    return Handler
+
+
+def serve(port=8765, delay=0.0, status=200, payload=PAYLOAD):
+    # Returns the server so callers can run it on a thread and shut it down
+    return ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(delay, status, payload)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=200)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay, args.status)
+    print(f"Serving stub weather on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
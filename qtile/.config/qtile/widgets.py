@@ -5,42 +5,20 @@ from qtile_extras import widget
 from qtile_extras.widget.decorations import BorderDecoration
 
 from colors import colors
-import subprocess
+import profiling
+import audio
+import backlight
+import battery
+import clock
+import env
+import weather
 
-import urllib.request
-import json
-import os
-import time
 
-
-def _load_env(path):
-    try:
-        with open(path) as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    k, v = line.split("=", 1)
-                    os.environ.setdefault(k.strip(), v.strip())
-    except FileNotFoundError:
-        pass
-
-
-_load_env(os.path.expanduser("~/.config/qtile/.env"))
+with profiling.section("load_env"):
+    env.dotenv.load()
 
 icon_font = "JetBrainsMono"
 
-# Global variable for weather updates (in seconds)
-WEATHER_UPDATE_INTERVAL = 600
-
-WEATHER_ICONS = {
-    "default": "",
-    "sun": "󰖙",
-    "cloud": "󰖐",
-    "rain": "󰖖",
-    "snow": "󰼶",
-    "fog": "󰖑",
-}
-
 
 def separator():
     return [
@@ -53,89 +31,6 @@ def separator():
     ]
 
 
-def get_weather_condition(condition_text):
-    if not condition_text:
-        return WEATHER_ICONS["default"]
-
-    condition = condition_text.lower()
-
-    # 1. Snow / Ice / Winter
-    # Matches: Light Snow, Flurries, Ice Crystals, Freezing Rain, Hail, Blowing Snow
-    if any(
-        x in condition
-        for x in ["snow", "flurr", "ice", "hail", "freezing", "squall", "drift", "blow"]
-    ):
-        return WEATHER_ICONS["snow"]
-
-    # 2. Rain / Liquid Precipitation
-    # Matches: Rain, Drizzle, Showers, Thunderstorm
-    if any(x in condition for x in ["rain", "shower", "drizzle", "thunder", "storm"]):
-        return WEATHER_ICONS["rain"]
-
-    # 3. Fog / Visibility / Atmosphere
-    # Matches: Fog, Mist, Haze, Smoke, Volcanic Ash
-    if any(x in condition for x in ["fog", "mist", "haze", "smoke", "ash"]):
-        return WEATHER_ICONS["fog"]
-
-    # 4. Clouds
-    # Matches: Cloudy, Mostly Cloudy, Overcast, Partly Cloudy, A mix of sun and cloud
-    if any(x in condition for x in ["cloud", "overcast", "gloom"]):
-        return WEATHER_ICONS["cloud"]
-
-    # 5. Sun / Clear (Default fallback for nice weather)
-    # Matches: Sunny, Mainly Sunny, Clear, Mainly Clear
-    if any(x in condition for x in ["sun", "clear"]):
-        return WEATHER_ICONS["sun"]
-
-    # Fallback if text matches nothing (e.g. empty string or unknown term)
-    return WEATHER_ICONS["default"]
-
-
-_weather_cache = {"time": 0, "temp": None, "icon": WEATHER_ICONS["default"]}
-
-
-def update_weather_cache():
-    now = time.time()
-    if now - _weather_cache["time"] < WEATHER_UPDATE_INTERVAL:
-        return
-
-    try:
-        api_key = os.getenv("WEATHER_API_KEY")
-        if not api_key:
-            return
-
-        lat = "53.5461"
-        lon = "-113.4938"
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-
-        with urllib.request.urlopen(url, timeout=10) as resp:
-            data = json.loads(resp.read().decode())
-
-        temp = data.get("main", {}).get("temp")
-        weather_list = data.get("weather", [])
-        cond = weather_list[0].get("description", "") if weather_list else ""
-
-        _weather_cache["temp"] = temp
-        _weather_cache["icon"] = get_weather_condition(cond)
-        _weather_cache["time"] = now
-
-    except Exception:
-        pass
-
-
-def get_weather_icon():
-    update_weather_cache()
-    return _weather_cache["icon"]
-
-
-def get_weather_temp():
-    update_weather_cache()
-    temp = _weather_cache["temp"]
-    if temp is not None:
-        return f"{int(temp)}°C"
-    return "N/A"
-
-
 def underLine(color):
     return {
         "decorations": [
@@ -149,26 +44,52 @@ def underLine(color):
     }
 
 
-def get_brightness():
-    try:
-        # Run the command and find the output
-        command = "brightnessctl -m | awk -F, '{print $4}' | tr -d '%' "
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, check=True
-        )
-        # The output is the clean percentage number (e.g., "50")
-        brightness = result.stdout.strip()
-        return f"{brightness}%"
-    except subprocess.CalledProcessError:
-        return "N/A"  # Return N/A if command fails
+class ProviderText(widget.TextBox):
+    # Renders a shared provider's value; the widget itself never polls
+    def __init__(self, provider, render=str, **config):
+        super().__init__(**config)
+        self.provider = provider
+        self.render = render
+
+    def _configure(self, qtile, bar):
+        super()._configure(qtile, bar)
+        # Subscribing first lets the provider prime its value (e.g. from an
+        # on-disk cache) before the first paint
+        self.provider.subscribe(self.refresh)
+        self.text = self.render(self.provider.value)
+
+    def finalize(self):
+        self.provider.unsubscribe(self.refresh)
+        super().finalize()
+
+    def refresh(self, value):
+        self.update(self.render(value))
+
+    def _draw_with_mirrors(self):
+        # For a CALCULATED-width mirror on another bar qtile redraws that
+        # whole bar, re-laying out every widget on it, on each of our draws.
+        # That is only needed when our width changed since the mirror was
+        # last placed; otherwise its copy is repainted where it is.
+        self._old_draw()
+        length = self.length
+        for mirror in self._mirrors:
+            if not mirror.configured:
+                continue
+            moved = getattr(mirror, "placed_length", None) != length
+            if mirror.bar is not self.bar and moved:
+                mirror.placed_length = length
+                mirror.bar.draw()
+            else:
+                mirror.draw()
 
 
 def dateWidget():
     return [
-        widget.Clock(
+        ProviderText(
+            clock.provider,
+            clock.get_date,
             background=colors["black"],
             foreground=colors["blue"],
-            format="%Y-%m-%d %a",
             padding=5,
             **underLine(colors["blue"]),
         ),
@@ -177,10 +98,11 @@ def dateWidget():
 
 def timeWidget():
     return [
-        widget.Clock(
+        ProviderText(
+            clock.provider,
+            clock.get_time,
             background=colors["black"],
             foreground=colors["purple"],
-            format="%H:%M",
             padding=10,
             **underLine(colors["purple"]),
         ),
@@ -222,24 +144,28 @@ def Systray():
 
 def batteryWidget():
     return [
-        widget.GenPollText(
+        ProviderText(
+            battery.provider,
+            battery.get_battery_icon,
             background=colors["black"],
-            fmt="",
+            foreground=colors["red"],
+            font=icon_font,
+            padding=5,
             **underLine(colors["red"]),
         ),
-        widget.UPowerWidget(
+        ProviderText(
+            battery.provider,
+            battery.get_battery_state,
             background=colors["black"],
             foreground=colors["red"],
-            battery_height=12,
-            battery_width=28,
-            text_charging="(Plugged In)",
-            text_discharging="(On Battery)",
+            padding=5,
             **underLine(colors["red"]),
         ),
-        widget.Battery(
+        ProviderText(
+            battery.provider,
+            battery.get_battery_percent,
             background=colors["black"],
             foreground=colors["red"],
-            format="{percent:2.0%}",
             padding=5,
             **underLine(colors["red"]),
         ),
@@ -256,17 +182,23 @@ def volumeWidget():
             padding=5,
             **underLine(colors["orange"]),
         ),
-        widget.Volume(
+        volumeText(
             background=colors["black"],
             foreground=colors["orange"],
             fmt="{}",
-            channel="Master",
             padding=5,
             **underLine(colors["orange"]),
         ),
     ] + separator()
 
 
+def volumeText(**config):
+    if audio.available():
+        return ProviderText(audio.provider, audio.get_volume, **config)
+    # Without pulsectl-asyncio, fall back to qtile's own polling widget
+    return widget.Volume(channel="Master", **config)
+
+
 def brightnessWidget():
     return [
         widget.TextBox(
@@ -277,13 +209,12 @@ def brightnessWidget():
             padding=5,
             **underLine(colors["yellow"]),
         ),
-        widget.GenPollText(
+        ProviderText(
+            backlight.provider,
+            backlight.get_brightness,
             background=colors["black"],
             foreground=colors["yellow"],
             name="brightness_display",
-            func=get_brightness,
-            update_interval=0.5,
-            format="{}",
             padding=5,
             **underLine(colors["yellow"]),
         ),
@@ -292,20 +223,20 @@ def brightnessWidget():
 
 def weatherWidget():
     return [
-        widget.GenPollText(
+        ProviderText(
+            weather.provider,
+            weather.get_weather_icon,
             background=colors["black"],
             foreground=colors["green"],
-            func=get_weather_icon,
-            update_interval=WEATHER_UPDATE_INTERVAL,
             font=icon_font,
             padding=5,
             **underLine(colors["green"]),
         ),
-        widget.GenPollText(
+        ProviderText(
+            weather.provider,
+            weather.get_weather_temp,
             background=colors["black"],
             foreground=colors["green"],
-            func=get_weather_temp,
-            update_interval=WEATHER_UPDATE_INTERVAL,
             fmt="{}",
             padding=5,
             **underLine(colors["green"]),
@@ -10,11 +10,16 @@
 from __future__ import (absolute_import, division, print_function)
 
 # You can import any python module as needed.
+from bisect import bisect_left
+from collections import OrderedDict
 import os
 
 # You always need to import ranger.api.commands here to get the Command class:
 from ranger.api.commands import Command
 
+# ranger's own commands, for the overrides below to build on
+from ranger.config import commands as default_commands
+
 
 # Any class that is a subclass of "Command" will be integrated into ranger as a
 # command.  Try typing ":my_edit<ENTER>" in ranger!
@@ -60,3 +65,483 @@ class my_edit(Command):
         # This is a generic tab-completion function that iterates through the
         # content of the current directory.
         return self._tab_directory_content()
+
+
+# -----------------------------------------------------------------------------
+# Overrides of ranger's own commands.  A class here with the name of a built-in
+# command replaces it, so each one subclasses the original and only changes
+# what it has to.
+# -----------------------------------------------------------------------------
+
+# Subdirectory listings for cd's tab completion, least recently used first:
+# {path: (mtime_ns, names)}.  Fuzzy completion lists up to _CD_FUZZY_BEAM
+# directories per level, so only the last _CD_LISTINGS_MAX are kept.
+_CD_LISTINGS = OrderedDict()
+_CD_LISTINGS_MAX = 2000
+
+
+def _list_subdirs(path):
+    """Names of the subdirectories of path, like next(os.walk(path))[1]
+
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed, so the listing is reused until then and repeated Tab presses
+    only cost a stat.  Raises OSError like os.scandir.
+    """
+    path = os.path.normpath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _CD_LISTINGS.get(path)
+    if cached is None or cached[0] != mtime:
+        names = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        names.append(entry.name)
+                except OSError:
+                    pass
+        cached = _CD_LISTINGS[path] = (mtime, tuple(names))
+        if len(_CD_LISTINGS) > _CD_LISTINGS_MAX:
+            _CD_LISTINGS.popitem(last=False)
+    _CD_LISTINGS.move_to_end(path)
+    return list(cached[1])
+
+
+# Prefix trie of the bookmarks for cd completion, rebuilt when they change:
+# [bookmark paths, trie]
+_CD_BOOKMARK_TRIE = [None, None]
+
+
+def _bookmark_trie(bookmarks):
+    """Trie over path components of the bookmarks, cached until they change
+
+    Each node is (children, bookmarks strictly below the node).
+    """
+    key = tuple(sorted(bookmarks))
+    if _CD_BOOKMARK_TRIE[0] != key:
+        root = ({}, [])
+        for bookmark in key:
+            node = root
+            for part in os.path.normpath(bookmark).rstrip(os.sep).split(os.sep):
+                node[1].append(bookmark)
+                node = node[0].setdefault(part, ({}, []))
+        _CD_BOOKMARK_TRIE[:] = [key, root]
+    return _CD_BOOKMARK_TRIE[1]
+
+
+def _bookmarks_below(trie, path):
+    node = trie
+    for part in os.path.normpath(path).rstrip(os.sep).split(os.sep):
+        node = node[0].get(part)
+        if node is None:
+            return ()
+    return node[1]
+
+
+# Fuzzy cd completion keeps this many partial paths per directory level
+# and returns at most _CD_FUZZY_LIMIT completions
+_CD_FUZZY_BEAM = 200
+_CD_FUZZY_LIMIT = 50
+
+
+def _fuzzy_score(pattern, name):
+    """Score name as an fzf-style subsequence match of pattern, or None
+
+    Consecutive characters, characters at the start of a word and a plain
+    prefix match score higher; gaps and longer names score lower.
+    """
+    if not pattern:
+        return 0
+    score = 0
+    pos = 0
+    prev = -2
+    for char in pattern:
+        found = name.find(char, pos)
+        if found < 0:
+            return None
+        if found == prev + 1:
+            score += 5
+        elif found == 0 or name[found - 1] in '-_. ':
+            score += 4
+        else:
+            score -= min(found - pos, 3)
+        prev = found
+        pos = found + 1
+    if name.startswith(pattern):
+        score += 10
+    return score - len(name) * 0.1
+
+
+# Tab after "cd -j" lists at most this many directories
+_CD_JUMP_LIMIT = 50
+
+
+class cd(default_commands.cd):
+    """:cd [-r] <path>
+    :cd -j <keyword> [keyword...]
+
+    ranger's cd (see commands_full.py), with tab completion reading
+    directories through a listing cache.
+    Using the option "-j" jumps to the most frecently visited directory
+    matching the keywords (needs plugins/frecency.py).
+    With cd_tab_fuzzy set, Tab ranks the matches by how well they match
+    and how often they were visited or bookmarked, best first.
+    With cd_bookmarks set, Tab merges the bookmarks through a prefix trie
+    instead of testing each one against every candidate, and lists each of
+    them once.
+    """
+
+    def execute(self):
+        if self.arg(1) == '-j':
+            self._jump(self.rest(2).split())
+            return
+        super(cd, self).execute()
+
+    def _jump(self, keywords):
+        try:
+            from plugins.frecency import database
+        except ImportError:
+            self.fm.notify('cd -j needs plugins/frecency.py', bad=True)
+            return
+        destination = database().best(keywords)
+        if destination is None:
+            self.fm.notify('No directory matches ' + ' '.join(keywords), bad=True)
+            return
+        self.fm.cd(destination)
+
+    def _tab_jump(self):
+        try:
+            from plugins.frecency import database
+        except ImportError:
+            return None
+        paths = database().matches(self.rest(2).split())[:_CD_JUMP_LIMIT]
+        if not paths:
+            return None
+        return [self.start(1) + path + os.path.sep for path in paths]
+
+    @staticmethod
+    def _tab_paths(dest, dest_abs, ends_with_sep):
+        if not dest:
+            try:
+                return _list_subdirs(dest_abs), dest_abs
+            except OSError:
+                return [], ''
+
+        if ends_with_sep:
+            try:
+                return [os.path.join(dest, path) for path in _list_subdirs(dest_abs)], ''
+            except OSError:
+                return [], ''
+
+        return None, None
+
+    def _tab_normal(self, dest, dest_abs):
+        dest_dir = os.path.dirname(dest)
+        dest_base = os.path.basename(dest)
+
+        try:
+            dirnames = _list_subdirs(os.path.dirname(dest_abs))
+        except OSError:
+            return [], ''
+
+        return [os.path.join(dest_dir, d) for d in dirnames if self._tab_match(dest_base, d)], ''
+
+    def _tab_fold(self, path_user, path_file):
+        """ Case-fold like ranger's _tab_match, per cd_tab_case """
+        if self.fm.settings.cd_tab_case == 'insensitive':
+            path_user = path_user.lower()
+            path_file = path_file.lower()
+        elif self.fm.settings.cd_tab_case == 'smart' and path_user.islower():
+            path_file = path_file.lower()
+        return path_user, path_file
+
+    def _tab_frecency(self):
+        """ Score boost for directories visited or bookmarked, and their parents """
+        # A bookmark counts like a couple of visits
+        weights = [(d.path, 1) for tab in self.fm.tabs.values() for d in tab.history.history]
+        weights += [(b.path, 2) for b in self.fm.bookmarks.dct.values()]
+        try:
+            from plugins.frecency import database
+        except ImportError:
+            pass
+        else:
+            frecency = database()
+            frecency.load()
+            weights += [(path, min(rank, 5)) for path, (rank, _) in frecency.entries.items()]
+
+        visits = {}
+        for path, weight in weights:
+            while True:
+                visits[path] = visits.get(path, 0) + weight
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        return dict((path, 2 * min(count, 5)) for path, count in visits.items())
+
+    def _tab_fuzzy_match(self, basepath, tokens):
+        """ Find directories matching tokens recursively, best match first """
+        if not tokens:
+            tokens = ['']
+        boost = self._tab_frecency()
+        beam = [(0, basepath)]
+        while True:
+            token = tokens.pop()
+            matches = []
+            for score, path in beam:
+                try:
+                    directories = _list_subdirs(path)
+                except OSError:
+                    continue
+                for directory in directories:
+                    dir_score = _fuzzy_score(*self._tab_fold(token, directory))
+                    if dir_score is not None:
+                        child = os.path.join(path, directory)
+                        matches.append((score + dir_score + boost.get(child, 0), child))
+            # Only the best partial paths are expanded further
+            matches.sort(key=lambda match: (-match[0], match[1]))
+            if not tokens or not matches:
+                return [path for _, path in matches[:_CD_FUZZY_LIMIT]]
+            beam = matches[:_CD_FUZZY_BEAM]
+
+    def _tab_bookmarks(self, paths, paths_rel):
+        """ Bookmarks below any of the candidate paths, each listed once """
+        trie = _bookmark_trie([v.path for v in self.fm.bookmarks.dct.values()])
+        seen = set(paths)
+        marks = []
+        for path in paths:
+            for mark in _bookmarks_below(trie, os.path.join(paths_rel, path)):
+                if paths_rel:
+                    mark = os.path.relpath(mark, paths_rel)
+                if mark not in seen:
+                    seen.add(mark)
+                    marks.append(mark)
+        return marks
+
+    def tab(self, tabnum):
+        from os.path import sep
+
+        if self.arg(1) == '-j':
+            return self._tab_jump()
+
+        start, dest, dest_abs, ends_with_sep = self._tab_args()
+
+        paths, paths_rel = self._tab_paths(dest, dest_abs, ends_with_sep)
+        if paths is None and self.fm.settings.cd_tab_fuzzy:
+            # Already ranked, best match first
+            paths, paths_rel = self._tab_fuzzy(dest, dest_abs)
+        else:
+            if paths is None:
+                paths, paths_rel = self._tab_normal(dest, dest_abs)
+            paths.sort()
+
+        if self.fm.settings.cd_bookmarks:
+            paths[0:0] = self._tab_bookmarks(paths, paths_rel)
+
+        if not paths:
+            return None
+        if len(paths) == 1:
+            return start + paths[0] + sep
+        return [start + dirname + sep for dirname in paths]
+
+
+# scout's name index per file list, also remembering the complete matches of
+# an earlier keystroke: {(id(files), attribute): _ScoutIndex}
+_SCOUT_INDEX = {}
+
+
+class _ScoutIndex(object):  # pylint: disable=too-few-public-methods
+    """ Names of a file list, built and lower-cased on demand, and matches """
+
+    def __init__(self, files, attr):
+        self.files = files
+        self.attr = attr
+        self._names = None
+        self._lowered = None
+        self.mode = None
+        self.pattern = None
+        self.matches = None
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = [getattr(fobj, self.attr) for fobj in self.files]
+        return self._names
+
+    @property
+    def lowered(self):
+        if self._lowered is None:
+            self._lowered = [name.lower() for name in self.names]
+        return self._lowered
+
+
+def _scout_index(files, attr):
+    # Directory.refilter() and reloads build new lists, so a list that is
+    # still the same object still has the same names
+    key = (id(files), attr)
+    index = _SCOUT_INDEX.get(key)
+    if index is None or index.files is not files:
+        if len(_SCOUT_INDEX) >= 4:
+            _SCOUT_INDEX.clear()
+        index = _SCOUT_INDEX[key] = _ScoutIndex(files, attr)
+    return index
+
+
+class _ScoutFilter(object):  # pylint: disable=too-few-public-methods
+    """ Stands in for the regex in temporary_filter with a set lookup """
+
+    def __init__(self, names, pattern):
+        self.names = frozenset(names)
+        self.pattern = pattern
+
+    def search(self, name):
+        return name in self.names
+
+
+class scout(default_commands.scout):
+    """:scout [-FLAGS...] <pattern>
+
+    ranger's scout (see commands_full.py), narrowing the previous
+    keystroke's matches while the pattern only grows instead of testing
+    every file again.
+    """
+
+    def quick(self):
+        # As ranger's, with the temporary filter answered from the index
+        asyoutype = self.AS_YOU_TYPE in self.flags
+        if self.FILTER in self.flags:
+            self.fm.thisdir.temporary_filter = self._build_filter()
+        if self.PERM_FILTER in self.flags and asyoutype:
+            self.fm.thisdir.filter = self._build_regex()
+        if self.FILTER in self.flags or self.PERM_FILTER in self.flags:
+            self.fm.thisdir.refilter()
+        if self._count(move=asyoutype) == 1 and self.AUTO_OPEN in self.flags:
+            return True
+        return False
+
+    def _build_filter(self):
+        # refilter() tests basenames against temporary_filter; answer from
+        # the incremental matches rather than running the regex again
+        cwd = self.fm.thisdir
+        if not self._incremental() or cwd.files_all is None:
+            return self._build_regex()
+
+        index = _scout_index(cwd.files_all, 'basename')
+        candidates = self._candidates(index)
+        if candidates is None:
+            candidates = range(len(cwd.files_all))
+        matches = self._select(index, candidates)
+        self._remember(index, matches)
+        names = index.names
+        return _ScoutFilter([names[i] for i in matches], self._build_regex().pattern)
+
+    def _incremental(self):
+        """ Whether extending the pattern can only ever drop matches """
+        return self.SM_REGEX not in self.flags and self.INVERT not in self.flags \
+            and self.pattern != '.'
+
+    def _plain(self):
+        """ (needle, ^-anchored, $-anchored, lower-cased) for a plain pattern
+
+        None when the pattern has to go through the regex.
+        """
+        flags = self.flags
+        if not self._incremental() or self.SM_GLOB in flags or self.SM_LETTERSKIP in flags:
+            return None
+        needle = self.pattern
+        anchor_start = needle.startswith('^')
+        if anchor_start:
+            needle = needle[1:]
+        anchor_end = needle.endswith('$')
+        if anchor_end:
+            needle = needle[:-1]
+        lower = self.IGNORE_CASE in flags or self.SMART_CASE in flags and needle.islower()
+        if lower:
+            needle = needle.lower()
+        return needle, anchor_start, anchor_end, lower
+
+    def _name_test(self):
+        """ A predicate on names, and whether it wants them lower-cased """
+        plain = self._plain()
+        if plain is None:
+            return self._build_regex().search, False
+
+        # A plain pattern needs no regex, only str methods
+        needle, anchor_start, anchor_end, lower = plain
+        if anchor_start and anchor_end:
+            return needle.__eq__, lower
+        if anchor_start:
+            return lambda name: name.startswith(needle), lower
+        if anchor_end:
+            return lambda name: name.endswith(needle), lower
+        return lambda name: needle in name, lower
+
+    def _select(self, index, candidates):
+        """ The candidates whose name in the index matches, in order """
+        plain = self._plain()
+        if plain is None or plain[1] or plain[2]:
+            test, lower = self._name_test()
+            names = index.lowered if lower else index.names
+            return [i for i in candidates if test(names[i])]
+        # Plain substring, the common case; spelled out to skip a call per name
+        needle, _, _, lower = plain
+        names = index.lowered if lower else index.names
+        return [i for i in candidates if needle in names[i]]
+
+    def _mode(self):
+        return tuple(flag in self.flags for flag in (
+            self.SM_GLOB, self.SM_LETTERSKIP, self.SM_REGEX,
+            self.IGNORE_CASE, self.SMART_CASE, self.INVERT))
+
+    def _candidates(self, index):
+        """ The complete matches of an earlier pattern this one extends, or None """
+        last = index.pattern
+        if last is None or index.mode != self._mode() or not self._incremental():
+            return None
+        if not self.pattern.startswith(last) or last.endswith('$'):
+            return None
+        return index.matches
+
+    def _remember(self, index, matches):
+        index.mode = self._mode()
+        index.pattern = self.pattern
+        index.matches = matches
+
+    def _count(self, move=False, offset=0):
+        cwd = self.fm.thisdir
+        files = cwd.files
+        pattern = self.pattern
+
+        if not pattern or not files:
+            return 0
+        if pattern == '.':
+            return 0
+        if pattern == '..':
+            return 1
+
+        # Walk from the cursor (plus offset) onwards, wrapping around, over
+        # the previous keystroke's matches when they still apply
+        index = _scout_index(files, 'relative_path')
+        test, lower = self._name_test()
+        candidates = self._candidates(index)
+        start = (cwd.pointer + offset) % len(files)
+        if candidates is None:
+            order = (i % len(files) for i in range(start, start + len(files)))
+        else:
+            split = bisect_left(candidates, start)
+            order = candidates[split:] + candidates[:split]
+
+        matches = []
+        for i in order:
+            name = files[i].relative_path
+            if test(name.lower() if lower else name):
+                matches.append(i)
+                if len(matches) > 1:
+                    break
+        else:
+            # Went through everything, so these are all the matches
+            self._remember(index, sorted(matches))
+
+        if move and matches:
+            cwd.move(to=matches[0])
+            self.fm.thisfile = cwd.pointed_obj
+        return len(matches)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Frecency database for ranger, in the spirit of z and zoxide.  Every
+# directory change bumps that directory's rank, and `:cd -j <keywords>`
+# jumps to the best match without touching the filesystem.
+#
+# The database is one "rank<TAB>time<TAB>path" line per directory.  Ranks
+# age the way z's do: once their sum passes MAX_RANK_TOTAL all of them are
+# scaled down and those falling below 1 are forgotten.  At most MAX_ENTRIES
+# directories are kept.
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import time
+
+import ranger.api
+
+MAX_RANK_TOTAL = 9000
+MAX_ENTRIES = 1000
+AGING = 0.9
+
+HOOK_INIT_OLD = ranger.api.hook_init
+
+
+def _name(path):
+    return os.path.basename(path.rstrip(os.sep)).lower()
+
+
+def _in_order(path, keywords):
+    pos = 0
+    for keyword in keywords:
+        found = path.find(keyword, pos)
+        if found < 0:
+            return False
+        pos = found + len(keyword)
+    return True
+
+
+class Frecency(object):
+    """ The on-disk database, re-read only when another ranger changed it """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._by_name = {}
+        self._mtime = None
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        entries = {}
+        if mtime is not None:
+            with open(self.path) as fobj:
+                for line in fobj:
+                    try:
+                        rank, atime, path = line.rstrip('\n').split('\t', 2)
+                        entries[path] = [float(rank), int(atime)]
+                    except ValueError:
+                        continue
+        self.entries = entries
+        self._mtime = mtime
+        self._reindex()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Written aside and renamed over so other rangers never read half
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as fobj:
+            for path, (rank, atime) in self.entries.items():
+                fobj.write('%g\t%d\t%s\n' % (rank, atime, path))
+        os.rename(tmp, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def add(self, path, now=None):
+        if '\n' in path:
+            return
+        self.load()
+        now = int(now or time.time())
+        entry = self.entries.get(path)
+        if entry is None:
+            self.entries[path] = [1.0, now]
+            self._by_name.setdefault(_name(path), set()).add(path)
+        else:
+            entry[0] += 1
+            entry[1] = now
+        self._age(now, path)
+        try:
+            self.save()
+        except OSError:
+            pass
+
+    def _age(self, now, current):
+        # `current` was just visited and is never the one forgotten
+        changed = False
+        if sum(rank for rank, _ in self.entries.values()) > MAX_RANK_TOTAL:
+            for path, entry in list(self.entries.items()):
+                entry[0] *= AGING
+                if entry[0] < 1 and path != current:
+                    del self.entries[path]
+            changed = True
+        if len(self.entries) > MAX_ENTRIES:
+            keep = sorted(self.entries, reverse=True,
+                          key=lambda p: (self.score(p, now), self.entries[p][1]))
+            keep = [current] + [path for path in keep if path != current]
+            keep = keep[:MAX_ENTRIES]
+            self.entries = dict((path, self.entries[path]) for path in keep)
+            changed = True
+        if changed:
+            self._reindex()
+
+    def _reindex(self):
+        # Last path component -> paths, so the common one-word jump is a
+        # dictionary lookup
+        self._by_name = {}
+        for path in self.entries:
+            self._by_name.setdefault(_name(path), set()).add(path)
+
+    def score(self, path, now=None):
+        rank, atime = self.entries[path]
+        age = (now or time.time()) - atime
+        if age < 3600:
+            return rank * 4
+        if age < 86400:
+            return rank * 2
+        if age < 604800:
+            return rank / 2
+        return rank / 4
+
+    def matches(self, keywords, now=None):
+        """ Directories containing the keywords in order, best first
+
+        The last keyword has to match the last path component.
+        """
+        self.load()
+        keywords = [keyword.lower() for keyword in keywords if keyword]
+        if not keywords:
+            hits = list(self.entries)
+        else:
+            last = keywords[-1]
+            hits = [path for path in self._by_name.get(last, ())
+                    if _in_order(path.lower(), keywords)]
+            if not hits:
+                hits = [path for path in self.entries
+                        if last in _name(path) and _in_order(path.lower(), keywords)]
+        now = now or time.time()
+        hits.sort(key=lambda path: -self.score(path, now))
+        return hits
+
+    def best(self, keywords):
+        hits = self.matches(keywords)
+        return hits[0] if hits else None
+
+
+_DATABASE = None
+
+
+def database(path=None):
+    global _DATABASE  # pylint: disable=global-statement
+    if _DATABASE is None:
+        if path is None:
+            path = os.path.join(
+                os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'),
+                'ranger', 'frecency')
+        _DATABASE = Frecency(path)
+    return _DATABASE
+
+
+def hook_init(fm):
+    database(fm.datapath('frecency'))
+
+    def on_cd(signal):
+        if signal.new is not None:
+            database().add(signal.new.path)
+
+    fm.signal_bind('cd', on_cd)
+    return HOOK_INIT_OLD(fm)
+
+
+ranger.api.hook_init = hook_init